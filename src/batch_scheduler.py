@@ -0,0 +1,284 @@
+"""
+Runs ReproBot on many bug reports with a pool of running emulators, e.g. the subjects of Evaluation/subjects.csv.
+Each report runs `tool_main.py` on a free emulator with the API level of the report within a wall-clock budget, and is
+retried if it ends without a result. Results are appended to a table in the layout of Evaluation/results.csv, reports
+already in the table are skipped when the scheduler is restarted.
+
+Example:
+    python batch_scheduler.py --manifest ../Evaluation/subjects.csv --datasetDir ../Dataset \
+        --emulators emulator-5554:5554:23,emulator-5556:5556:26 --outputDir ./batch_output
+"""
+import argparse
+import csv
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from glob import glob
+from os import makedirs
+from os.path import join, exists, dirname, realpath, abspath, splitext, basename
+
+TOOL_MAIN = join(dirname(realpath(__file__)), "tool_main.py")
+ANDROID_VERSION_API_LEVELS = {"4.4": 19, "5": 21, "5.1": 22, "6": 23, "7": 24, "7.1": 25, "8": 26, "8.1": 27, "9": 28,
+                              "10": 29, "11": 30, "12": 31, "13": 33}
+MANIFEST_FILE_COLUMNS = {"report": "Report File", "apk": "APK File", "crash_log": "Crash Log File",
+                         "setup_script": "Setup Script"}
+DATASET_DIRS = {"report": ("BugReports", ".txt"), "apk": ("APKs", ".apk"), "crash_log": ("ErrorMessages", ".txt"),
+                "setup_script": ("SetupScripts", ".py")}
+BOOT_TIMEOUT = 300
+
+logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s %(message)s", level=logging.INFO,
+                    handlers=[logging.StreamHandler(sys.stdout)])
+logger = logging.getLogger("batch-scheduler")
+
+
+class Job:
+    def __init__(self, report_id, api_level, files):
+        self.report_id = report_id
+        self.api_level = api_level
+        self.files = files
+        self.attempts = 0
+
+
+class Emulator:
+    def __init__(self, device_id, adb_port, api_level, adb_cmd="adb"):
+        self.device_id = device_id
+        self.adb_port = adb_port
+        self.api_level = api_level
+        self.adb_cmd = adb_cmd
+
+    def adb(self, *args, timeout=60):
+        try:
+            return subprocess.run([self.adb_cmd, "-s", self.device_id, *args], stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL, universal_newlines=True, timeout=timeout).stdout.strip()
+        except subprocess.TimeoutExpired:
+            return ""
+
+    def is_healthy(self):
+        return self.adb("get-state") == "device" and self.adb("shell", "getprop", "sys.boot_completed") == "1"
+
+    def reboot(self):
+        logger.info(f"Rebooting {self.device_id}")
+        self.adb("reboot")
+        deadline = time.time() + BOOT_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(10)
+            if self.is_healthy():
+                return True
+        return False
+
+    def __str__(self):
+        return f"{self.device_id} (API {self.api_level})"
+
+
+def get_api_level(sdk):
+    sdk = sdk.strip()
+    if sdk in ANDROID_VERSION_API_LEVELS:
+        return ANDROID_VERSION_API_LEVELS[sdk]
+    return int(float(sdk))  # already an API level
+
+
+def find_dataset_file(dataset_dir, kind, report_id):
+    sub_dir, ext = DATASET_DIRS[kind]
+    candidates = [f for f in glob(join(dataset_dir, sub_dir, "**", "*" + ext), recursive=True)
+                  if splitext(basename(f))[0] == report_id]
+    return abspath(candidates[0]) if len(candidates) != 0 else None
+
+
+def load_jobs(manifest_file, dataset_dir, report_ids=None):
+    jobs = []
+    with open(manifest_file, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            report_id = row["Bug Report ID"].strip()
+            if report_ids is not None and report_id not in report_ids:
+                continue
+            files = {}
+            for kind, column in MANIFEST_FILE_COLUMNS.items():
+                if row.get(column):
+                    files[kind] = abspath(row[column])
+                elif dataset_dir is not None:
+                    files[kind] = find_dataset_file(dataset_dir, kind, report_id)
+                else:
+                    files[kind] = None
+            missing = [kind for kind in ["report", "apk", "crash_log"] if files[kind] is None]
+            if len(missing) != 0:
+                logger.error(f"Skipped {report_id}: no {', '.join(missing)} file found")
+                continue
+            jobs.append(Job(report_id, get_api_level(row["SDK"]), files))
+    return jobs
+
+
+def parse_emulators(emulators, adb_cmd):
+    pool = []
+    for emulator in emulators.split(","):
+        device_id, adb_port, api_level = emulator.strip().split(":")
+        pool.append(Emulator(device_id, adb_port, int(api_level), adb_cmd))
+    return pool
+
+
+def read_finished_reports(results_file):
+    if not exists(results_file):
+        return set()
+    with open(results_file, "r", newline="") as f:
+        return {row[0] for row in list(csv.reader(f))[1:] if len(row) != 0}
+
+
+def parse_runtime(log, name):
+    match = re.findall(name + r" Running Time: ([0-9.]+)", log)
+    return float(match[-1]) if len(match) != 0 else None
+
+
+class Scheduler:
+    def __init__(self, jobs, emulators, args):
+        self.pending = list(jobs)
+        self.emulators = emulators
+        self.args = args
+        self.lock = threading.Condition()
+        self.running = {}  # API level -> jobs being run, a failed one may come back for the same API level
+        self.results_file = join(args.outputDir, "results.csv")
+        self.header = ["report id"] + [f"{args.runName} {column}" for column in
+                                       ["Result", "Total Runtime", "NLP Runtime", "Search Runtime"]]
+
+    def next_job(self, emulator):
+        # None once no job of the API level is pending or running, otherwise wait for a running one to be requeued
+        with self.lock:
+            while True:
+                for job in self.pending:
+                    if job.api_level == emulator.api_level:
+                        self.pending.remove(job)
+                        self.running[job.api_level] = self.running.get(job.api_level, 0) + 1
+                        return job
+                if self.running.get(emulator.api_level, 0) == 0:
+                    return None
+                self.lock.wait()
+
+    def finish_job(self, job, requeue=False):
+        with self.lock:
+            self.running[job.api_level] -= 1
+            if requeue:
+                self.pending.append(job)
+            self.lock.notify_all()
+
+    def write_result(self, job, result, total_runtime, nlp_runtime):
+        search_runtime = max(total_runtime - nlp_runtime, 0)
+        row = [job.report_id, result, round(total_runtime, 1), round(nlp_runtime, 1), round(search_runtime, 1)]
+        with self.lock:
+            new_file = not exists(self.results_file)
+            with open(self.results_file, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(self.header)
+                writer.writerow(row)
+        logger.info(f"{job.report_id}: {result}, total {row[2]}s, NLP {row[3]}s, search {row[4]}s")
+
+    def get_job_cmd(self, job, emulator, output_dir):
+        cmd = [sys.executable, TOOL_MAIN, "--reportFile", job.files["report"], "--apkFile", job.files["apk"],
+               "--crashLogFile", job.files["crash_log"], "--deviceId", emulator.device_id,
+               "--adbPort", emulator.adb_port, "--outputDir", output_dir, "--openieIP", self.args.openieIP]
+        if job.files["setup_script"] is not None:
+            cmd += ["--setupScript", job.files["setup_script"]]
+        if self.args.configFile is not None:
+            cmd += ["--configFile", abspath(self.args.configFile)]
+        if self.args.noVisuals:
+            cmd += ["-noVisuals"]
+        return cmd
+
+    def run_job(self, job, emulator):
+        # returns (result, total runtime, nlp runtime), result is None if the run ended without a result
+        job.attempts += 1
+        output_dir = abspath(join(self.args.outputDir, job.report_id, f"attempt_{job.attempts}"))
+        makedirs(output_dir, exist_ok=True)
+        log_file = join(output_dir, "reprobot.log")
+        logger.info(f"{job.report_id}: attempt {job.attempts} on {emulator}")
+        start_time = time.time()
+        timed_out = False
+        with open(log_file, "w") as log:
+            process = subprocess.Popen(self.get_job_cmd(job, emulator, output_dir), cwd=dirname(TOOL_MAIN),
+                                       stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+            try:
+                process.wait(timeout=self.args.timeout)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                os.killpg(process.pid, signal.SIGTERM)
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+        total_runtime = min(time.time() - start_time, self.args.timeout)
+        with open(log_file, "r", errors="replace") as log:
+            log = log.read()
+        nlp_runtime = parse_runtime(log, "NLP") or 0
+        if "Successfully reproduced!" in log:
+            return "Success", total_runtime, nlp_runtime
+        if timed_out:
+            return "Failed Timeout", self.args.timeout, nlp_runtime
+        if parse_runtime(log, "RL") is not None:  # stopped by the epoch limit
+            return "Failed Timeout", total_runtime, nlp_runtime
+        logger.error(f"{job.report_id}: ReproBot exited with code {process.returncode} without a result, see {log_file}")
+        return None, total_runtime, nlp_runtime
+
+    def serve(self, emulator):
+        while True:
+            if not emulator.is_healthy() and not emulator.reboot():
+                logger.error(f"{emulator} is broken, removing it from the pool")
+                return
+            job = self.next_job(emulator)
+            if job is None:
+                return
+            requeue = False
+            start_time = time.time()
+            try:
+                result, total_runtime, nlp_runtime = self.run_job(job, emulator)
+                if result is not None:
+                    self.write_result(job, result, total_runtime, nlp_runtime)
+                elif job.attempts <= self.args.retries:
+                    requeue = True  # the emulator is checked before its next job
+                else:
+                    self.write_result(job, "Failed Error", total_runtime, nlp_runtime)
+            except Exception as e:
+                logger.error(f"{job.report_id}: failed to run on {emulator}: {e}")
+                self.write_result(job, "Failed Error", time.time() - start_time, 0)
+            finally:
+                self.finish_job(job, requeue)  # the other emulators of the API level may wait for this job
+
+    def run(self):
+        api_levels = {emulator.api_level for emulator in self.emulators}
+        for job in [job for job in self.pending if job.api_level not in api_levels]:
+            logger.error(f"Skipped {job.report_id}: no emulator with API level {job.api_level}")
+            self.pending.remove(job)
+        threads = [threading.Thread(target=self.serve, args=(emulator,)) for emulator in self.emulators]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for job in self.pending:
+            logger.error(f"{job.report_id} was not run, no healthy emulator with API level {job.api_level} left")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run ReproBot on many bug reports with a pool of emulators.")
+    parser.add_argument("--manifest", required=True, help="csv with the columns 'Bug Report ID' and 'SDK' (Android version), optionally 'Report File', 'APK File', 'Crash Log File' and 'Setup Script'")
+    parser.add_argument("--datasetDir", default=None, help="the downloaded dataset, used to find the files missing in the manifest")
+    parser.add_argument("--emulators", required=True, help="comma separated deviceId:adbPort:apiLevel of the running emulators")
+    parser.add_argument("--outputDir", default="./batch_output")
+    parser.add_argument("--timeout", default=3600, type=int, help="wall-clock budget of a report in seconds")
+    parser.add_argument("--retries", default=2, type=int, help="retries of a report that ended without a result")
+    parser.add_argument("--runName", default="ReproBot_1", help="column prefix in the results table")
+    parser.add_argument("--reports", default=None, help="comma separated report ids to run, all by default")
+    parser.add_argument("--configFile", default=None)
+    parser.add_argument("--openieIP", default="localhost")
+    parser.add_argument("--adbCmd", default="adb")
+    parser.add_argument("-noVisuals", default=False, action="store_true")
+    args = parser.parse_args()
+
+    makedirs(args.outputDir, exist_ok=True)
+    report_ids = set(r.strip() for r in args.reports.split(",")) if args.reports else None
+    finished = read_finished_reports(join(args.outputDir, "results.csv"))
+    jobs = [job for job in load_jobs(args.manifest, args.datasetDir, report_ids) if job.report_id not in finished]
+    logger.info(f"{len(jobs)} reports to run, {len(finished)} already in the results")
+    Scheduler(jobs, parse_emulators(args.emulators, args.adbCmd), args).run()
@@ -0,0 +1,92 @@
+import csv
+import time
+import traceback
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from os import makedirs
+from os.path import join, basename, exists, abspath, dirname, relpath, splitext, commonpath
+
+from nlp_module.openie_client import openie_client
+from nlp_module.process_bug_report import nlp_main
+from utils.config import nlp_output_dir
+from utils.nlp_models import load_model
+from utils.nlp_util import similarity_cache
+from utils.preprocess import obtain_all_reports
+from utils.utils import get_logger, read_json
+
+logger = get_logger("batch-nlp")
+
+SUMMARY_HEADER = ["report id", "Result", "NLP Runtime", "Number of S2Rs", "S2R File"]
+CACHE_SAVE_INTERVAL = 300  # seconds between saves of the shared caches by a worker
+
+last_cache_save = 0
+
+
+def list_batch_reports(report_dir=None, report_list_file=None):
+    reports = []
+    if report_dir:
+        reports.extend(obtain_all_reports(report_dir))
+    if report_list_file:
+        with open(report_list_file, "r") as f:
+            reports.extend([line.strip() for line in f if line.strip() != ""])
+    return list(dict.fromkeys(reports))
+
+
+def save_caches():
+    global last_cache_save
+    openie_client.save()
+    similarity_cache.save()
+    last_cache_save = time.time()
+
+
+def init_worker():
+    global last_cache_save
+    load_model()  # each worker loads the spaCy model once and keeps it for all of its reports
+    last_cache_save = time.time()
+    # pool workers skip atexit hooks, a finalizer still runs when the worker exits after pool.close()
+    Finalize(None, save_caches, exitpriority=10)
+
+
+def process_report_in_worker(job):
+    bug_report_path, reports_root = job
+    # relative to the reports root, reports with the same file name in different directories do not collide
+    report_id = splitext(relpath(abspath(bug_report_path), reports_root))[0]
+    report_name = basename(report_id)
+    report_output_dir = join(nlp_output_dir, report_id)
+    s2r_file = join(report_output_dir, "s2rs-" + report_name + ".json")
+    graphene_output_file = join(report_output_dir, report_name + "-graphene.json")
+    start_time = time.time()
+    try:
+        nlp_main(bug_report_path, s2r_file, graphene_output_file)
+        result = "Success"
+        s2r_count = len(read_json(s2r_file))
+    except (Exception, SystemExit) as e:  # run_graphene exits on failure, which must not take down the worker
+        logger.error(f"NLP failed on {bug_report_path}: {e}\n{traceback.format_exc()}")
+        result = "Failed"
+        s2r_count = 0
+    if time.time() - last_cache_save >= CACHE_SAVE_INTERVAL:
+        save_caches()
+    return [report_id, result, round(time.time() - start_time, 1), s2r_count, s2r_file]
+
+
+def batch_nlp_main(bug_report_paths, workers):
+    logger.info(f"Running NLP on {len(bug_report_paths)} reports with {workers} workers")
+    summary_file = join(nlp_output_dir, "batch_nlp_summary.csv")
+    makedirs(nlp_output_dir, exist_ok=True)
+    write_header = not exists(summary_file)
+    if len(bug_report_paths) == 0:
+        return
+    reports_root = commonpath([dirname(abspath(path)) for path in bug_report_paths])
+    batch_start_time = time.time()
+    with open(summary_file, "a", newline="") as f, Pool(workers, initializer=init_worker) as pool:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(SUMMARY_HEADER)
+        jobs = [(path, reports_root) for path in bug_report_paths]
+        for row in pool.imap_unordered(process_report_in_worker, jobs):
+            writer.writerow(row)
+            f.flush()  # stream the summary so a long batch can be followed while running
+            logger.info(f"{row[0]}: {row[1]}, {row[3]} S2Rs in {row[2]}s")
+        pool.close()
+        pool.join()  # let the workers exit on their own so they save their caches
+    logger.info(f"Batch NLP Running Time: {time.time() - batch_start_time}, summary in {summary_file}")
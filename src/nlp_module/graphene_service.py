@@ -0,0 +1,140 @@
+import atexit
+import queue
+import subprocess
+import threading
+from os import makedirs
+from os.path import join, exists, dirname, realpath, abspath, getmtime, pathsep
+
+from utils.config import GRAPHENE_JAR, JAVA_CMD, JAVAC_CMD, cache_dir, graphene_pool_size, graphene_timeout
+from utils.utils import get_logger
+
+logger = get_logger("graphene-service")
+
+SERVICE_SOURCE = join(dirname(dirname(realpath(__file__))), "utils", "graphene_service", "GrapheneService.java")
+SERVICE_CLASS_DIR = join(cache_dir, "graphene_service")
+HEALTH_CHECK_TIMEOUT = 10
+STARTUP_TIMEOUT = 300
+
+compile_error = None  # a failed compile is not retried for every report
+
+
+def compile_service():
+    global compile_error
+    if compile_error is not None:
+        raise Exception(compile_error)
+    class_file = join(SERVICE_CLASS_DIR, "GrapheneService.class")
+    if exists(class_file) and getmtime(class_file) >= getmtime(SERVICE_SOURCE):
+        return
+    makedirs(SERVICE_CLASS_DIR, exist_ok=True)
+    try:
+        run_result = subprocess.run([JAVAC_CMD, "-cp", GRAPHENE_JAR, "-d", SERVICE_CLASS_DIR, SERVICE_SOURCE],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:  # javac is missing
+        compile_error = "Failed to compile Graphene service: %s" % e
+        raise Exception(compile_error)
+    if run_result.returncode != 0:
+        compile_error = "Failed to compile Graphene service: %s" % run_result.stderr.decode()
+        raise Exception(compile_error)
+
+
+class GrapheneWorker:
+    # one long-lived JVM running GrapheneService, requests and responses are lines over stdin/stdout
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.responses = queue.Queue()
+        self.process = subprocess.Popen(
+            [JAVA_CMD, "-Xmx4g", "-cp", GRAPHENE_JAR + pathsep + SERVICE_CLASS_DIR, "GrapheneService", GRAPHENE_JAR],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, bufsize=1)
+        self.reader = threading.Thread(target=self.__read_responses, daemon=True)
+        self.reader.start()
+        if self.__read_response(STARTUP_TIMEOUT) != "READY":
+            self.close()
+            raise Exception(f"Graphene worker {worker_id} failed to start")
+        logger.info(f"Graphene worker {worker_id} started")
+
+    def __read_responses(self):
+        for line in self.process.stdout:
+            self.responses.put(line.strip())
+        self.responses.put(None)  # the JVM exited
+
+    def __read_response(self, timeout):
+        try:
+            return self.responses.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __request(self, request, timeout):
+        try:
+            self.process.stdin.write(request + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            return None
+        return self.__read_response(timeout)
+
+    def is_healthy(self):
+        return self.process.poll() is None and self.__request("PING", HEALTH_CHECK_TIMEOUT) == "PONG"
+
+    def run(self, bug_report_file, output_file):
+        response = self.__request(f"{abspath(bug_report_file)}\t{abspath(output_file)}", graphene_timeout)
+        if response != "OK":
+            logger.error(f"Graphene worker {self.worker_id} failed: {response}")
+            if response is None:  # timed out or died, a stale response would be mixed into the next request
+                self.close()
+            return False
+        return True
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write("QUIT\n")
+                self.process.stdin.flush()
+                self.process.wait(5)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+class GraphenePool:
+    # a fixed number of Graphene workers, started on demand and restarted when they fail a health check
+    def __init__(self, size):
+        self.size = size
+        self.idle_workers = queue.Queue()
+        for i in range(size):
+            self.idle_workers.put(i)
+        self.workers = {}
+        self.lock = threading.Lock()
+
+    def __healthy_worker(self, worker_id):
+        worker = self.workers.get(worker_id)
+        if worker is not None and not worker.is_healthy():
+            logger.warning(f"Graphene worker {worker_id} is unhealthy, restarting it")
+            worker.close()
+            worker = None
+        if worker is None:
+            with self.lock:
+                compile_service()
+            worker = GrapheneWorker(worker_id)
+            self.workers[worker_id] = worker
+        return worker
+
+    def run(self, bug_report_file, output_file):
+        worker_id = self.idle_workers.get()
+        try:
+            return self.__healthy_worker(worker_id).run(bug_report_file, output_file)
+        finally:
+            self.idle_workers.put(worker_id)
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.close()
+        self.workers = {}
+
+
+graphene_pool = None
+
+
+def get_graphene_pool():
+    global graphene_pool
+    if graphene_pool is None:
+        graphene_pool = GraphenePool(graphene_pool_size)
+        atexit.register(graphene_pool.close)
+    return graphene_pool
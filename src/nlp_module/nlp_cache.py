@@ -0,0 +1,81 @@
+import hashlib
+import json
+from os import makedirs, getpid, replace
+from os.path import join, exists, dirname, getsize, basename, realpath
+from shutil import copyfile
+
+from utils.config import cache_dir, config, TOOL_VERSION, nlp_cache_version
+from utils.utils import get_logger, file_hash
+
+logger = get_logger("nlp-cache")
+
+# nlp config knobs that only affect speed, changing them must not invalidate cached results
+PERFORMANCE_ONLY_KEYS = ["cache_dir", "similarity_cache_size", "persist_similarity_cache", "use_graphene_service",
+                         "graphene_pool_size", "graphene_timeout", "openie_max_workers", "openie_timeout",
+                         "enable_nlp_cache"]
+SRC_DIR = dirname(dirname(realpath(__file__)))
+# the code that produces the cached outputs, editing any of these files invalidates the cache
+NLP_PIPELINE_SOURCES = [join(SRC_DIR, "nlp_module", "process_bug_report.py"),
+                        join(SRC_DIR, "nlp_module", "context_extractor.py"),
+                        join(SRC_DIR, "utils", "nlp_util.py"),
+                        join(SRC_DIR, "utils", "preprocess.py")]
+
+
+def read_text(file_path):
+    with open(file_path, "r") as f:
+        return f.read()
+
+
+def nlp_config_for_cache():
+    return {k: v for k, v in config['nlp'].items() if k not in PERFORMANCE_ONLY_KEYS}
+
+
+def get_pipeline_version():
+    if nlp_cache_version is not None:
+        return str(nlp_cache_version)
+    digest = hashlib.sha256(" ".join(file_hash(source) for source in NLP_PIPELINE_SOURCES).encode())
+    return f"{TOOL_VERSION}-{digest.hexdigest()[:12]}"
+
+
+def graphene_jar_id(jar_path):
+    return f"{basename(jar_path)} {getsize(jar_path) if exists(jar_path) else 0}"
+
+
+class NLPCache:
+    # content-addressed store of NLP stage outputs, a stage's key covers its inputs, the relevant config and the version
+    # of the NLP pipeline code
+    def __init__(self, root):
+        self.root = root
+        self.version = None
+
+    def key(self, stage, *parts):
+        if self.version is None:
+            self.version = get_pipeline_version()
+        digest = hashlib.sha256(f"{self.version} {stage}".encode())
+        for part in parts:
+            if not isinstance(part, str):
+                part = json.dumps(part, sort_keys=True)
+            digest.update(b"\0" + part.encode())
+        return digest.hexdigest()
+
+    def __path(self, stage, key):
+        return join(self.root, stage, key)
+
+    def load(self, stage, key, target_file):
+        cached_file = self.__path(stage, key)
+        if not exists(cached_file):
+            return False
+        makedirs(dirname(target_file) or ".", exist_ok=True)
+        copyfile(cached_file, target_file)
+        logger.info(f"Reused cached {stage} output {key[:12]} for {target_file}")
+        return True
+
+    def store(self, stage, key, source_file):
+        cached_file = self.__path(stage, key)
+        makedirs(dirname(cached_file), exist_ok=True)
+        tmp_file = f"{cached_file}.{getpid()}.tmp"  # batch workers may store the same entry concurrently
+        copyfile(source_file, tmp_file)
+        replace(tmp_file, cached_file)
+
+
+nlp_cache = NLPCache(join(cache_dir, "nlp"))
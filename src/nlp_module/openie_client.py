@@ -0,0 +1,89 @@
+import atexit
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from os import getpid, replace
+from os.path import exists, join
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.cmd_args import openie_id
+from utils.config import cache_dir, openie_max_workers, openie_timeout
+from utils.utils import get_logger, read_json, dump_json
+
+logger = get_logger("openie-client")
+
+
+class OpenIE5Client:
+    # OpenIE5 extractions over one keep-alive HTTP session, cached on disk by sentence text
+    def __init__(self, server_url, cache_file=None, max_workers=1):
+        self.extract_url = server_url.rstrip("/") + "/getExtraction"
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=max_workers))
+        self.cache_file = cache_file
+        self.cache = {}
+        self.dirty = False
+        self.failures = 0  # failed requests, their sentences are missing from the extractions
+        self.lock = threading.Lock()
+        if cache_file and exists(cache_file):
+            try:
+                self.cache = read_json(cache_file)
+            except Exception as e:
+                logger.warning(f"Failed to load OpenIE5 cache {cache_file}: {e}")
+
+    def __request(self, sent):
+        response = self.session.post(self.extract_url, data=sent.encode("utf-8"), timeout=openie_timeout)
+        response.raise_for_status()
+        return json.loads(response.text)
+
+    def extract(self, sent):
+        with self.lock:
+            if sent in self.cache:
+                return self.cache[sent]
+        try:
+            extraction = self.__request(sent)
+        except Exception:
+            with self.lock:
+                self.failures += 1
+            raise
+        with self.lock:
+            self.cache[sent] = extraction
+            self.dirty = True
+        return extraction
+
+    def prefetch(self, sentences):
+        # extract all not cached sentences concurrently, the later extract calls are then served from the cache
+        with self.lock:
+            missing = [sent for sent in dict.fromkeys(sentences) if sent not in self.cache]
+        if len(missing) == 0:
+            return
+        logger.info(f"Extracting {len(missing)} sentences with OpenIE5 using {self.max_workers} connections")
+
+        def _extract(sent):
+            try:
+                self.extract(sent)
+            except Exception as e:
+                logger.error(f"OpenIE5 failed to extract \"{sent}\": {e}")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(_extract, missing))
+
+    def save(self):
+        if not self.cache_file or not self.dirty:
+            return
+        with self.lock:
+            if exists(self.cache_file):  # other processes may have added extractions since we loaded the cache
+                try:
+                    self.cache = {**read_json(self.cache_file), **self.cache}
+                except Exception as e:
+                    logger.warning(f"Failed to merge OpenIE5 cache {self.cache_file}: {e}")
+            tmp_file = f"{self.cache_file}.{getpid()}.tmp"
+            dump_json(self.cache, tmp_file)
+            replace(tmp_file, self.cache_file)
+            self.dirty = False
+
+
+openie_client = OpenIE5Client(f'http://{openie_id}:8000', join(cache_dir, "openie5.json"), openie_max_workers)
+atexit.register(openie_client.save)
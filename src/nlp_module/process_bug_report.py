@@ -3,22 +3,30 @@ import subprocess
 import time
 from os.path import basename, join, exists, dirname
 
-import requests
-from pyopenie import OpenIE5
-
 from nlp_module.context_extractor import initialize_simple_context, extract_input_value_from_phrase
+from nlp_module.graphene_service import get_graphene_pool
+from nlp_module.nlp_cache import nlp_cache, read_text, nlp_config_for_cache, graphene_jar_id
+from nlp_module.openie_client import openie_client
 from utils.config import GRAPHENE_JAR, JAVA_CMD, enable_context_analysis, \
     enable_relation_analysis, action_word_list, position_keywords, empty_s2r, use_openIE5, device_words, \
-    multi_action_type_threshold, empty_ui_action
-from utils.nlp_util import get_word_similarity, check_if_is_S2R, keyword_match
+    multi_action_type_threshold, empty_ui_action, use_graphene_service, enable_nlp_cache, overwriteNLP, \
+    spacy_model_name
+from utils.nlp_util import check_if_is_S2R, keyword_match, WordMatrix, clean_word
 from utils.preprocess import process_report
 from utils.utils import get_logger, read_json, dump_json
-from utils.cmd_args import openie_id
 
 logger = get_logger("nlp-module")
 
 
 def run_graphene(bug_report_file, output_file):
+    if use_graphene_service:
+        try:
+            if get_graphene_pool().run(bug_report_file, output_file) and exists(output_file):
+                logger.info("Graphene generated reports in %s" % output_file)
+                return
+        except Exception as e:
+            logger.error(e)
+        logger.warning("Graphene service failed on %s, falling back to a one-off run" % basename(bug_report_file))
     run_result = subprocess.run([JAVA_CMD, "-jar", "-Xmx4g", GRAPHENE_JAR, bug_report_file, output_file],
                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     if run_result.returncode != 0:
@@ -31,18 +39,43 @@ def run_graphene(bug_report_file, output_file):
 
 
 
+class ActionVocabulary:
+    # the action words of each action type embedded once, so classifying a relation is one vector-matrix product
+    def __init__(self, action_words_by_type):
+        self.action_types = list(action_words_by_type.keys())
+        self.words = []
+        self.type_slices = {}
+        for action_type, action_words in action_words_by_type.items():
+            self.type_slices[action_type] = slice(len(self.words), len(self.words) + len(action_words))
+            self.words.extend(action_words)
+        self.matrix = WordMatrix([clean_word(word.lower()) for word in self.words])
+
+    def max_sim_for_each_type(self, action_word):
+        # (type, max_sim_word, max_sim_value) of each action type, in the order of the config
+        sims = WordMatrix([clean_word(action_word.lower())]).similarity(self.matrix)[0]
+        results = []
+        for action_type in self.action_types:
+            type_slice = self.type_slices[action_type]
+            best = type_slice.start + int(sims[type_slice].argmax())
+            results.append([action_type, self.words[best], float(sims[best])])
+        return results
+
+
+action_vocabulary = None
+
+
+def get_action_vocabulary():
+    global action_vocabulary
+    if action_vocabulary is None:
+        action_vocabulary = ActionVocabulary(action_word_list)
+    return action_vocabulary
+
+
 def classify_action(action_word, orig_sent):
     final_type = None
     final_sim = None
-    max_sim_for_each_type = []
-    for action_type, action_words in action_word_list.items():
-        sim_results = [
-            (get_word_similarity(action_word, word), word)
-            for word in action_words
-        ]
-        sim_results.sort(key=lambda x: x[0], reverse=True)
-        max_sim_for_each_type.append([action_type, sim_results[0][1], sim_results[0][
-            0]])  # select the max of the similarity score within one group (type, max_sim_value, max_sim_word)
+    max_sim_for_each_type = get_action_vocabulary().max_sim_for_each_type(action_word)  # select the max of the similarity score within one group (type, max_sim_word, max_sim_value)
+    max_sim_by_type = {action_type: sim for action_type, _, sim in max_sim_for_each_type}
     max_sim_for_each_type.sort(key=lambda x: x[-1], reverse=True)  # select the most similar group
     final_type = max_sim_for_each_type[0][0]
     final_sim = max_sim_for_each_type[0][2]
@@ -63,7 +96,7 @@ def classify_action(action_word, orig_sent):
     ui_actions = [final_ui_action]
     if final_type in ['INPUT','CLICK']:
         alternative_action_type = "INPUT" if final_type == "CLICK" else "CLICK"
-        alter_action_sim = max([get_word_similarity(action_word, word) for word in action_word_list[alternative_action_type]])
+        alter_action_sim = max_sim_by_type[alternative_action_type]
         alter_action = empty_ui_action.copy()
         alter_action["action"] = alternative_action_type
         alter_action["action_similarity"] = alter_action_sim
@@ -74,8 +107,7 @@ def classify_action(action_word, orig_sent):
 
 
 def extract_with_OpenIE5(s2r, sent):
-    extractor = OpenIE5(f'http://{openie_id}:8000')
-    extraction = extractor.extract(sent)
+    extraction = openie_client.extract(sent)
     if len(extraction) > 0:
         extraction = sorted(extraction, key=lambda x: x['confidence'], reverse=True)
         try:
@@ -124,19 +156,39 @@ def analyze_scroll_direction(ui_action):
 
 
 
+patch_sentences = [
+    "I enter something into Secret fields .",
+    "I enter something into the Label .",
+    "I set 30 Feb 2018 .",
+    "I give the Exercise a name .",
+    "I tap the add FAB .",
+    "I click Read aloud ."
+] # openIE5 would make mistakes on these sentences, for them, use Graphene instead
+
+
+def patch_clause(sent):
+    if sent['origSent'] == "I specify .":
+        sent['origSent'] = "I specify Google account ."
+
+
+def prefetch_OpenIE5_extractions(sentences):
+    # send every sentence extract_S2Rs may ask OpenIE5 about at once, with bounded parallelism
+    to_extract = []
+    for sent in sentences:
+        sentenceMap = list(sent['extractionMap'].values())
+        if len(sentenceMap) == 0:
+            to_extract.append(sent['originalSentence'])
+        for clause in sentenceMap:
+            patch_clause(clause)
+            if clause['origSent'] not in patch_sentences:
+                to_extract.append(clause['origSent'])
+    openie_client.prefetch(to_extract)
+
+
 def s2r_from_sentenceMap(sent, originalSentence, sentence_map):
     logger.debug(f"analysing clause {sent['id']}")
     S2R = dict(empty_s2r)
-    if sent['origSent'] == "I specify .":
-        sent['origSent'] = "I specify Google account ."
-    patch_sentences = [
-        "I enter something into Secret fields .",
-        "I enter something into the Label .",
-        "I set 30 Feb 2018 .",
-        "I give the Exercise a name .",
-        "I tap the add FAB .",
-        "I click Read aloud ."
-    ] # openIE5 would make mistakes on these sentences, for them, use Graphene instead
+    patch_clause(sent)
     if use_openIE5 and sent['origSent'] not in patch_sentences:
         try:
             extract_with_OpenIE5(S2R, sent['origSent'])
@@ -205,6 +257,8 @@ def extract_S2Rs(graphene_result_file):
     sentences: list = graphene_result_file['sentences']
     # sentence_needs_openIE5 = ["Select \"Live map\" view"]
     S2Rs = list()
+    if use_openIE5:
+        prefetch_OpenIE5_extractions(sentences)
     while len(sentences) > 0:
         sent = sentences.pop(0)
         logger.debug(f"analyzing sentence {sent['sentenceIdx']}: {sent['originalSentence']}")
@@ -270,27 +324,78 @@ def filter_s2rs(S2Rs):
     return filtered_s2rs
 
 
-def nlp_main(bug_report_path, s2r_file, graphene_output_file):
-    nlp_start_time = time.time()
+def preprocess_report(bug_report_path, s2r_file):
+    temp_bug_report_path = join(dirname(s2r_file), basename(bug_report_path).replace(".txt", "-m.txt"))
+    process_report(bug_report_path, temp_bug_report_path)
+    return temp_bug_report_path
+
+
+def extract_S2Rs_to_file(bug_report_path, graphene_output_file, s2r_file):
+    graphene_output = read_json(graphene_output_file)
+    add_orignal_sentence(bug_report_path, graphene_output)
+    S2Rs = extract_S2Rs(graphene_output)
+    S2Rs = filter_s2rs(S2Rs)
+    dump_S2Rs_to_file(S2Rs, s2r_file)
+
+
+def run_nlp_stages(bug_report_path, s2r_file, graphene_output_file):
     logger.info("running Graphene...")
     if not exists(graphene_output_file):
-        temp_bug_report_path = join(dirname(s2r_file), basename(bug_report_path).replace(".txt", "-m.txt"))
-        process_report(bug_report_path, temp_bug_report_path)
+        temp_bug_report_path = preprocess_report(bug_report_path, s2r_file)
         if not exists(temp_bug_report_path):
             logger.warning("Failed to preprocess bug report.")
             graphene_main(bug_report_path, graphene_output_file)
         else:
             graphene_main(temp_bug_report_path, graphene_output_file)
-    graphene_output = read_json(graphene_output_file)
-    add_orignal_sentence(bug_report_path, graphene_output)
     logger.info("extracting S2Rs...")
     if not exists(s2r_file):
-        S2Rs = extract_S2Rs(graphene_output)
-        S2Rs = filter_s2rs(S2Rs)
-        dump_S2Rs_to_file(S2Rs, s2r_file)
+        extract_S2Rs_to_file(bug_report_path, graphene_output_file, s2r_file)
+
+
+def run_nlp_stages_with_cache(bug_report_path, s2r_file, graphene_output_file):
+    # each stage is keyed on its own inputs, so a change only invalidates the stages whose inputs actually changed
+    use_cached = not overwriteNLP
+    report_text = read_text(bug_report_path)
+    logger.info("running Graphene...")
+    if not (use_cached and exists(graphene_output_file)):
+        temp_bug_report_path = join(dirname(s2r_file), basename(bug_report_path).replace(".txt", "-m.txt"))
+        key = nlp_cache.key("preprocess", report_text, spacy_model_name, action_word_list)
+        if not (use_cached and nlp_cache.load("preprocess", key, temp_bug_report_path)):
+            preprocess_report(bug_report_path, s2r_file)
+            if exists(temp_bug_report_path):
+                nlp_cache.store("preprocess", key, temp_bug_report_path)
+        graphene_input = temp_bug_report_path
+        if not exists(temp_bug_report_path):
+            logger.warning("Failed to preprocess bug report.")
+            graphene_input = bug_report_path
+
+        key = nlp_cache.key("graphene", read_text(graphene_input), graphene_jar_id(GRAPHENE_JAR))
+        if not (use_cached and nlp_cache.load("graphene", key, graphene_output_file)):
+            graphene_main(graphene_input, graphene_output_file)
+            nlp_cache.store("graphene", key, graphene_output_file)
+
+    logger.info("extracting S2Rs...")
+    if not (use_cached and exists(s2r_file)):
+        key = nlp_cache.key("s2r", report_text, read_text(graphene_output_file), nlp_config_for_cache())
+        if not (use_cached and nlp_cache.load("s2r", key, s2r_file)):
+            openie_failures = openie_client.failures
+            extract_S2Rs_to_file(bug_report_path, graphene_output_file, s2r_file)
+            if openie_client.failures == openie_failures:
+                nlp_cache.store("s2r", key, s2r_file)
+            else:  # the S2Rs fell back to Graphene's relations, a later run with OpenIE5 up may do better
+                logger.warning("OpenIE5 failed on some sentences, the S2Rs are not cached")
+
+
+def nlp_main(bug_report_path, s2r_file, graphene_output_file):
+    nlp_start_time = time.time()
+    if enable_nlp_cache:
+        run_nlp_stages_with_cache(bug_report_path, s2r_file, graphene_output_file)
+    else:
+        run_nlp_stages(bug_report_path, s2r_file, graphene_output_file)
     logger.info("done...")
     nlp_end_time = time.time()
     logger.info(f"NLP Running Time: {nlp_end_time - nlp_start_time}")
+    return nlp_end_time - nlp_start_time
 
 
 def analyze_graphene_relations(S2R, S2Rs, first_sentence, originalSentence, sentence_map):
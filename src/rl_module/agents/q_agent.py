@@ -4,7 +4,7 @@ from os.path import join, exists
 
 from rl_module.components.action import Action
 from rl_module.components.state_obj import State
-from rl_module.environment.reward_calculator import calculate_reward
+from rl_module.environment.reward_calculator import calculate_rewards
 from utils.config import rl_running_log_dir, failure_penalty, init_q_value_with_reward, use_state_based_epsilon, \
     enable_menu_drawer_heuristic, menu_drawer_init_q_value, enable_init_q_value_for_rotate, \
     enable_init_q_value_for_swipe, enable_init_q_value_for_scroll, default_scroll_init_q_value, \
@@ -24,44 +24,77 @@ class QAgent():
         self.epsilon_decay = epsilon_decay
         self.epsilon_table = {}
         self.q_table = {}
+        self.initial_state_hash = None  # the first state this agent saw, the shared Q-table of a parallel run has more
         self.state_hash_obj_map = {}
         self.action_hash_obj_map = {}
 
     def try_init_q_value_for_state(self, cur_state: State, screen_size):
         state_hash = cur_state.__hash__()
         self.state_hash_obj_map[state_hash] = cur_state
+        if self.initial_state_hash is None:
+            self.initial_state_hash = state_hash
         if state_hash not in self.q_table:
             self.q_table[state_hash] = {}
         available_actions = cur_state.obtain_available_actions()
+        init_q_values = self.calculate_init_q_values(cur_state, state_hash, available_actions, screen_size)
         for action in available_actions:
             action_hash = action.__hash__()
             self.action_hash_obj_map[action_hash] = action
             if action_hash in self.q_table[state_hash]:
                 continue
             if len(cur_state.unmatched_s2rs) == 0: # there is no s2r to be matched, then we don't give any action a init-Q, we just want it to random explore
-                self.q_table[state_hash][action_hash] = missing_step_penalty
+                self.set_q_value(state_hash, action_hash, missing_step_penalty)
                 continue
-            if action.s2r.get_first_ui_action_type() == 'ROTATE' and enable_init_q_value_for_rotate: # if the matched s2r is a rotate s2r, give it a higher init q_value to encourage it
-                init_q_value = default_rotate_init_q_value
-            elif action.ui_event.action == 'SWIPE' and enable_init_q_value_for_swipe: # if the matched ui event is a rotate s2r, give it a higher init q_value to encourage it
-                logger.info("Give initial Q value for a swipe action")
-                init_q_value = default_swipe_init_q_value
-            elif action.ui_event.action == 'SCROLL' and enable_init_q_value_for_scroll:
-                logger.info("Give initial Q value for a scroll action")
-                init_q_value = default_scroll_init_q_value
-            elif action.ui_event.action == "CLICK" and "OK" in action.ui_event.get_text_on_target_view() and action.s2r.is_noop_s2r() and enable_init_q_value_for_OK:
-                logger.info("Give initial Q value for a click OK action")
-                init_q_value = default_OK_init_q_value
-            else:
-                reward = calculate_reward(action, screen_size)
-                init_q_value = reward['total']
+            init_q_value = init_q_values[action_hash]
             if action.s2r.get_first_ui_action_type() == "INPUT" and enable_init_q_value_for_input:
                 logger.info("Give initial Q value for a matched input action")
                 init_q_value = max(default_input_init_q_value, init_q_value)
-            self.q_table[state_hash][action_hash] = init_q_value
-            if is_expand_menu_or_drawer_noop(action) and enable_menu_drawer_heuristic and len(self.q_table) == 1: # check the length of the q-table to only apply this heuristic to the initial UI state
+            self.set_q_value(state_hash, action_hash, init_q_value)
+            if is_expand_menu_or_drawer_noop(action) and enable_menu_drawer_heuristic and state_hash == self.initial_state_hash: # only apply this heuristic to the initial UI state
                 logger.debug("identified a menu button or a drawer button")
-                self.q_table[state_hash][action_hash] = menu_drawer_init_q_value
+                self.set_q_value(state_hash, action_hash, menu_drawer_init_q_value)
+
+    def set_q_value(self, state_hash, action_hash, q_value):
+        self.q_table[state_hash][action_hash] = q_value
+
+    def get_default_init_q_value(self, action):
+        # init q-value given by heuristics instead of the reward, None if the reward should be used
+        if action.s2r.get_first_ui_action_type() == 'ROTATE' and enable_init_q_value_for_rotate: # if the matched s2r is a rotate s2r, give it a higher init q_value to encourage it
+            return default_rotate_init_q_value
+        elif action.ui_event.action == 'SWIPE' and enable_init_q_value_for_swipe: # if the matched ui event is a rotate s2r, give it a higher init q_value to encourage it
+            logger.info("Give initial Q value for a swipe action")
+            return default_swipe_init_q_value
+        elif action.ui_event.action == 'SCROLL' and enable_init_q_value_for_scroll:
+            logger.info("Give initial Q value for a scroll action")
+            return default_scroll_init_q_value
+        elif action.ui_event.action == "CLICK" and "OK" in action.ui_event.get_text_on_target_view() and action.s2r.is_noop_s2r() and enable_init_q_value_for_OK:
+            logger.info("Give initial Q value for a click OK action")
+            return default_OK_init_q_value
+        return None
+
+    def calculate_init_q_values(self, cur_state: State, state_hash, available_actions, screen_size):
+        # rewards of all not yet initialized actions of the state are scored in one batch
+        if len(cur_state.unmatched_s2rs) == 0:
+            return {}
+        init_q_values = {}
+        pending_actions = {}
+        for action in available_actions:
+            action_hash = action.__hash__()
+            if action_hash in self.q_table[state_hash] or action_hash in init_q_values or action_hash in pending_actions:
+                continue
+            init_q_value = self.get_default_init_q_value(action)
+            if init_q_value is None:
+                pending_actions[action_hash] = action
+            else:
+                init_q_values[action_hash] = init_q_value
+        # rewards are memoized on the state, so an interned state is not scored again
+        unscored_actions = [action for action_hash, action in pending_actions.items() if action_hash not in cur_state.action_rewards]
+        rewards = calculate_rewards(unscored_actions, screen_size)
+        for action, reward in zip(unscored_actions, rewards):
+            cur_state.action_rewards[action.__hash__()] = reward
+        for action_hash in pending_actions:
+            init_q_values[action_hash] = cur_state.action_rewards[action_hash]['total']
+        return init_q_values
 
     def get_epsilon_for_state(self, state_hash):
         if use_state_based_epsilon:
@@ -107,7 +140,7 @@ class QAgent():
         return final_selected_action
 
     def exploit_action(self, available_actions, state_hash):
-        random.shuffle(available_actions)
+        available_actions = random.sample(available_actions, len(available_actions))  # the state's list is shared, shuffle a copy
         # exploitation
         max_reward = -float('inf')
         max_action = []
@@ -138,8 +171,8 @@ class QAgent():
         except ValueError: # next state is failure state, with no entry in Q-table
             max_next_state_value = failure_penalty
         old_q_value = self.q_table[state_hash][action_hash]
-        self.q_table[state_hash][action_hash] = old_q_value + self.lr * (
-                    reward + self.df * max_next_state_value - old_q_value)
+        self.set_q_value(state_hash, action_hash, old_q_value + self.lr * (
+                    reward + self.df * max_next_state_value - old_q_value))
         logger.info(
             f"Updated value of ({state_hash},{action_hash}) from {old_q_value} to {self.q_table[state_hash][action_hash]}")
 
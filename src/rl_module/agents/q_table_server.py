@@ -0,0 +1,76 @@
+import threading
+from multiprocessing.managers import BaseManager
+
+
+class QTableStore:
+    # the Q-table shared by the parallel RL workers. Every pushed entry gets a new version, so a worker only pulls the
+    # entries changed since its last pull. Concurrent updates of an entry are resolved by the last push
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.q_table = {}
+        self.change_log = []  # (state hash, action hash), the version of a change is its position + 1
+        self.winner = None
+
+    def push(self, updates):
+        with self.lock:
+            for state_hash, action_q_values in updates.items():
+                self.q_table.setdefault(state_hash, {}).update(action_q_values)
+                self.change_log.extend((state_hash, action_hash) for action_hash in action_q_values)
+            return len(self.change_log)
+
+    def pull(self, since_version):
+        with self.lock:
+            updates = {}
+            for state_hash, action_hash in self.change_log[since_version:]:
+                updates.setdefault(state_hash, {})[action_hash] = self.q_table[state_hash][action_hash]
+            return updates, len(self.change_log)
+
+    def report_success(self, worker_id):
+        with self.lock:
+            if self.winner is None:
+                self.winner = worker_id
+            return self.winner
+
+    def get_winner(self):
+        return self.winner
+
+    def should_stop(self):
+        return self.winner is not None
+
+    def size(self):
+        with self.lock:
+            return sum(len(actions) for actions in self.q_table.values())
+
+
+q_table_store = None
+
+
+def get_q_table_store():
+    global q_table_store
+    if q_table_store is None:
+        q_table_store = QTableStore()
+    return q_table_store
+
+
+class QTableManager(BaseManager):
+    pass
+
+
+QTableManager.register("get_q_table_store", callable=get_q_table_store)
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def start_q_table_server(address, authkey):
+    manager = QTableManager(address=parse_address(address), authkey=authkey)
+    manager.start()
+    return manager
+
+
+def connect_q_table_server(address, authkey):
+    manager = QTableManager(address=parse_address(address), authkey=authkey)
+    manager.connect()
+    return manager.get_q_table_store()
@@ -0,0 +1,33 @@
+from rl_module.agents.q_agent import QAgent
+from utils.utils import get_logger
+
+logger = get_logger("Shared-Q-Agent")
+
+
+class SharedQAgent(QAgent):
+    # a QAgent of a parallel RL worker. Q-values written locally are pushed to the shared Q-table service and the
+    # values written by the other workers are pulled, at every sync
+    def __init__(self, q_table_store, worker_id, learning_rate, discount_factor, epsilon, epsilon_decay):
+        super().__init__(learning_rate, discount_factor, epsilon, epsilon_decay)
+        self.q_table_store = q_table_store
+        self.worker_id = worker_id
+        self.dirty_entries = {}
+        self.version = 0
+
+    def set_q_value(self, state_hash, action_hash, q_value):
+        super().set_q_value(state_hash, action_hash, q_value)
+        self.dirty_entries.setdefault(state_hash, {})[action_hash] = q_value
+
+    def sync(self):
+        if len(self.dirty_entries) != 0:
+            self.q_table_store.push(self.dirty_entries)
+            self.dirty_entries = {}
+        updates, self.version = self.q_table_store.pull(self.version)
+        for state_hash, action_q_values in updates.items():
+            self.q_table.setdefault(state_hash, {}).update(action_q_values)
+
+    def report_success(self):
+        return self.q_table_store.report_success(self.worker_id)
+
+    def should_stop(self):
+        return self.q_table_store.should_stop()
@@ -1,39 +1,37 @@
-from bs4 import Tag
-
 from rl_module.components.s2r import S2R
-from utils.nlp_util import parse_uiautomator_location
-from utils.utils import get_text_from_view, get_content_description_from_view, get_resource_id_from_view
+from rl_module.components.view import FrozenRecord, ViewRecord
 import hashlib
 
 
-class Event:
-    def __init__(self, view_xml: Tag, action, screen_shot, input_value=None, swipe_direction = "", scroll_direction = ""):
+class Event(FrozenRecord):
+    __slots__ = ("view", "action", "input_value", "swipe_direction", "scroll_direction", "hash_str")
+
+    def __init__(self, view: ViewRecord, action, input_value=None, swipe_direction = "", scroll_direction = ""):
         if swipe_direction == "":
             swipe_direction = "left"
         if scroll_direction == "":
             scroll_direction = "down"
-        self.view_xml = view_xml
-        self.action = action
-        self.input_value = input_value
-        self.icon = self.crop_icon_screenshot(screen_shot, self.parse_ui_bound())
-        self.caption = None
-        self.swipe_direction = swipe_direction
-        self.scroll_direction = scroll_direction
+        self._set("view", view)
+        self._set("action", action)
+        self._set("input_value", input_value)
+        self._set("swipe_direction", swipe_direction)
+        self._set("scroll_direction", scroll_direction)
+        self._set("hash_str", f"{view.hash_str} {action} {input_value}")
 
     def get_str_for_hash(self):
-        return f"{str(self.view_xml.attrs)} {self.action} {self.input_value}"
+        return self.hash_str
 
     def get_xy(self):
         x_1, y_1, x_2, y_2 = self.parse_ui_bound()
-        center_x = (int(x_1) + int(x_2)) // 2
-        center_y = (int(y_1) + int(y_2)) // 2
+        center_x = (x_1 + x_2) // 2
+        center_y = (y_1 + y_2) // 2
         return center_x, center_y
 
     def parse_ui_bound(self):
-        return parse_uiautomator_location(self.view_xml['bounds'])
+        return self.view.bounds
 
     def get_resource_id(self):
-        return self.view_xml['resource-id']
+        return self.view['resource-id']
 
     def __scroll_down_range(self): # scroll from lower coordinate to higher coordinate
         x_1, y_1, x_2, y_2 = self.parse_ui_bound()
@@ -41,7 +39,7 @@ class Event:
         f_y = y_2 - 1
         t_x = (x_1 + x_2) / 2
         t_y = y_1 + 1
-        return f"[{int(f_x)},{int(f_y)}][{int(t_x)},{int(t_y)}]"
+        return int(f_x), int(f_y), int(t_x), int(t_y)
 
     def __scroll_up_range(self): # scroll from higher coordinate to lower coordinate
         x_1, y_1, x_2, y_2 = self.parse_ui_bound()
@@ -49,7 +47,7 @@ class Event:
         f_y = y_1 - 1
         t_x = (x_1 + x_2) / 2
         t_y = y_2 + 1
-        return f"[{int(f_x)},{int(f_y)}][{int(t_x)},{int(t_y)}]"
+        return int(f_x), int(f_y), int(t_x), int(t_y)
 
     def __swipe_left_range(self):
         x_1, y_1, x_2, y_2 = self.parse_ui_bound()
@@ -58,7 +56,7 @@ class Event:
         f_y = (y_1 + y_2) / 2
         t_x = x_1 + 1
         t_y = (y_1 + y_2) / 2
-        return f"[{int(f_x)},{int(f_y)}][{int(t_x)},{int(t_y)}]"
+        return int(f_x), int(f_y), int(t_x), int(t_y)
 
     def __swipe_right_range(self):
         x_1, y_1, x_2, y_2 = self.parse_ui_bound()
@@ -67,10 +65,16 @@ class Event:
         f_y = (y_1 + y_2) / 2
         t_x = x_2 - 1
         t_y = (y_1 + y_2) / 2
-        return f"[{int(f_x)},{int(f_y)}][{int(t_x)},{int(t_y)}]"
+        return int(f_x), int(f_y), int(t_x), int(t_y)
 
     def get_scroll_or_swipe_range(self):
-        # For SCROLL, default direction is scroll down
+        points = self.get_scroll_or_swipe_points()
+        if points is None:
+            return None
+        return "[%d,%d][%d,%d]" % points
+
+    def get_scroll_or_swipe_points(self):
+        # (from x, from y, to x, to y). For SCROLL, default direction is scroll down
         if self.action == "SCROLL":
             if self.scroll_direction == "up":
                 return self.__scroll_up_range()
@@ -84,16 +88,15 @@ class Event:
 
 
     def get_text_on_target_view(self):
-        text_set = get_text_from_view(self.view_xml)
-        return list(text_set)
+        return list(self.view.texts)
 
     def get_content_description(self):
-        return get_content_description_from_view(self.view_xml)
+        return self.view.content_description
 
 
     def get_dict(self):
         return {
-            "target_view": self.view_xml.attrs,
+            "target_view": self.view.attrs,
             "action": self.action,
             "input_value": self.input_value,
             "content_description": self.get_content_description(),
@@ -103,6 +106,10 @@ class Event:
             # "caption": self.get_caption()
         }
 
+    def get_icon(self, screen_shot):
+        # cropped on demand from the original screenshot of the state
+        return self.crop_icon_screenshot(screen_shot, self.parse_ui_bound())
+
     def crop_icon_screenshot(self, screen_shot, bounds):
         return screen_shot[bounds[1]:bounds[3], bounds[0]:bounds[2]]
 
@@ -115,13 +122,16 @@ class Event:
             return f"{self.action}"
 
     def get_resource_id_name(self):
-        return get_resource_id_from_view(self.view_xml)
+        return self.view.resource_id_name
+
 
+class Action(FrozenRecord):
+    __slots__ = ("ui_event", "s2r", "hash")
 
-class Action:
     def __init__(self, ui_event: Event, s2r: S2R):
-        self.ui_event = ui_event
-        self.s2r = s2r
+        self._set("ui_event", ui_event)
+        self._set("s2r", s2r)
+        self._set("hash", int(hashlib.md5(f"{ui_event.get_str_for_hash()} {str(s2r)}".encode()).hexdigest(), 16))
 
     def __str__(self):
         return f"step: {self.s2r.get_index()}, {self.s2r.get_first_ui_action_type()}, {self.s2r.get_target_word()}; event: {self.ui_event}"
@@ -141,4 +151,4 @@ class Action:
         return False
 
     def __hash__(self):
-        return int(hashlib.md5(f"{self.ui_event.get_str_for_hash()} {str(self.s2r)}".encode()).hexdigest(), 16)
+        return self.hash
@@ -1,18 +1,23 @@
 from utils.config import default_action_type_tweak_threshold
 from utils.nlp_util import get_word_similarity
-from utils.utils import is_editable_view, is_clickable_view, get_text_from_view, get_logger
+from utils.utils import get_logger
 
 logger = get_logger("s2r")
 
 class S2R:
+    # S2Rs are shared between the environment and all states and are never modified, action type tweaks of a state
+    # are kept as an overlay of enabled ui action positions
     def __init__(self, s2r_json):
         self.s2r_json = s2r_json
 
     # decompose one s2r with multiple predicted ui actions to multiple s2r each of which has one ui action
-    def decompose_s2r(self):
-        enabled_ui_actions = list(filter(lambda x: x['enabled'], self.s2r_json['ui_actions']))
+    def decompose_s2r(self, enabled_overlay=frozenset()):
         decomposed_s2rs = []
-        for ui_action in enabled_ui_actions:
+        for position, ui_action in enumerate(self.s2r_json['ui_actions']):
+            if not ui_action['enabled']:
+                if position not in enabled_overlay:
+                    continue
+                ui_action = dict(ui_action, enabled=True)
             new_s2r = self.s2r_json.copy()
             new_s2r['ui_actions'] = [ui_action]
             decomposed_s2rs.append(S2R(new_s2r))
@@ -23,26 +28,28 @@ class S2R:
             return ""
         return self.s2r_json['ui_actions'][0]['action']
 
+    # returns the position of the ui action to be enabled for the view, None if there is no tweak
     def tweak_ui_action(self, view):
         if self.is_noop_s2r() or len(self.s2r_json['ui_actions']) < 2:
-            return
+            return None
         second_ui_action = self.s2r_json['ui_actions'][1]
-        if is_editable_view(view):
+        if view.is_editable():
             if second_ui_action['action'] != "INPUT":
-                return
-        elif is_clickable_view(view):
+                return None
+        elif view.is_clickable():
             if second_ui_action['action'] != "CLICK":
-                return
+                return None
         else:
-            return
-        texts_on_view = get_text_from_view(view)
+            return None
+        texts_on_view = view.texts
         textual_similarity = max([
                 get_word_similarity(self.get_target_word(), text)
                 for text in texts_on_view
             ], default=0)
         if textual_similarity > default_action_type_tweak_threshold:
-            second_ui_action['enabled'] = True
             logger.info("Identified a similar target, enabled potential %s action" % second_ui_action['action'])
+            return 1
+        return None
 
 
     def is_noop_s2r(self):
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+
+from rl_module.components.state_obj import State, scan_ui_hierarchy, fingerprint, get_state_hash, \
+    get_interactables_digest
+from utils.utils import get_logger
+
+logger = get_logger("state-cache")
+
+
+class StateCache:
+    # interns states by their hash and interactable views, a revisited state reuses the views, actions and rewards of
+    # its first observation
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.states = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_state(self, ui_hierarchy, unmatched_s2rs, remaining_missing_steps, screen_shot):
+        scan = scan_ui_hierarchy(ui_hierarchy)
+        ui_fingerprint = fingerprint(" ".join(sorted(scan[1])))
+        state_hash = get_state_hash(ui_fingerprint, unmatched_s2rs, remaining_missing_steps)
+        # states with the same hash can still differ in their interactable views and so in their actions
+        cache_key = (state_hash, get_interactables_digest(scan[0]))
+        state = self.states.get(cache_key)
+        if state is not None:
+            self.hits += 1
+            self.states.move_to_end(cache_key)
+            return state.observe(ui_hierarchy, screen_shot)
+        self.misses += 1  # the S2Rs are immutable, the state can keep the tuple of unmatched ones
+        state = State(ui_hierarchy, unmatched_s2rs, remaining_missing_steps, screen_shot, scan=scan)
+        if self.max_size > 0:  # the template drops the hierarchy and screenshot, observe() supplies fresh ones
+            self.states[cache_key] = state.observe(None, None)
+            if len(self.states) > self.max_size:
+                self.states.popitem(last=False)
+        return state
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return
+        logger.info(f"State cache: {self.hits}/{total} hits ({self.hits / total:.1%}), {len(self.states)} states")
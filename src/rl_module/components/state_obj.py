@@ -1,8 +1,8 @@
 import random
 import re
+from copy import copy
 from os.path import join
 
-from bs4 import BeautifulSoup
 from typing import List
 
 from rl_module.components.action import Action, Event
@@ -10,56 +10,94 @@ from rl_module.components.s2r import S2R
 from utils.config import default_input_text, empty_s2r, uiautomator_state_dir, pkg_name, allow_out_of_order_s2r_match, \
     allow_match_missing_step_after_all_s2r, back_view_Tag, enable_action_type_tweak
 from utils.nlp_util import parse_uiautomator_location
-from utils.utils import dump_json, dump_file, dump_cv_img, is_clickable_view, is_editable_view, \
-    is_long_clickable_view, is_swipable_view, is_scrollable_view, is_back_view, viewGroupClasses, compute_input_value, \
-    is_not_filled_by_default_text
+from rl_module.components.view import ViewRecord
+from utils.ui_hierarchy import is_view
+from utils.utils import dump_json, dump_file, dump_cv_img, compute_input_value, is_not_filled_by_default_text, \
+    get_view_capabilities, is_interactable_view
 import cv2 as cv
 import hashlib
 
+TIME_POINT_PATTERN = re.compile('((1[0-2]|0?[1-9]):([0-5][0-9]) ?([AaPp][Mm]))')
+FINGERPRINT_PACKAGES = frozenset([pkg_name, "com.google.android.packageinstaller"])
+FINGERPRINT_IGNORED_ATTRS = frozenset(["focused"])
+
+
+def fingerprint(s):
+    # fast non-cryptographic 64 bit hash, used for state identity
+    return int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+
+
+def get_leaf_view_str(view):
+    attrs = view.attrs
+    display_time_point = TIME_POINT_PATTERN.match(attrs.get('text') or '') is not None
+    return str({k: ('' if k == 'text' and display_time_point else v)
+                for k, v in attrs.items() if k not in FINGERPRINT_IGNORED_ATTRS})
+
+
+def scan_ui_hierarchy(ui_hierarchy):
+    # one traversal of the hierarchy in document order, each view is classified once and the app leaf views are
+    # collected for the fingerprint
+    interactable_nodes = []
+    app_view_strs = []
+    for view in ui_hierarchy.descendants:
+        if not is_view(view):
+            continue
+        if is_interactable_view(view, pkg_name):
+            interactable_nodes.append(view)
+        if view.get('package') in FINGERPRINT_PACKAGES and next(iter(view.children), None) is None:
+            app_view_strs.append(get_leaf_view_str(view))
+    return interactable_nodes, app_view_strs
+
+
+def get_interactables_digest(interactable_nodes):
+    # the inputs of the views and actions of a state, e.g. permission buttons and containers the fingerprint skips
+    return fingerprint(" ".join(str(view.attrs) for view in interactable_nodes))
+
+
+def get_unmatched_s2r_str(unmatched_s2rs):
+    s2r_indexs = [str(s2r.get_index()) for s2r in unmatched_s2rs]
+    s2r_indexs.sort()
+    return " ".join(s2r_indexs)
+
+
+def get_state_hash(ui_fingerprint, unmatched_s2rs, remaining_missing_steps):
+    return fingerprint(f"{ui_fingerprint} {get_unmatched_s2r_str(unmatched_s2rs)} {remaining_missing_steps}")
+
 
 class State:
-    def __init__(self, ui_hierarchy: BeautifulSoup, unmatched_s2rs, remaining_missing_steps, screen_shot):
+    def __init__(self, ui_hierarchy, unmatched_s2rs, remaining_missing_steps, screen_shot, scan=None):
         self.ui_hierarchy = ui_hierarchy
         self.unmatched_s2rs = unmatched_s2rs
         self.remaining_missing_steps = remaining_missing_steps
-        self.interactable_views = self.__init_interactable_view()
-        self.id_str = self.get_id_str()
-        self.orig_screen_shot = screen_shot.copy()
-        self.screen_shot = self.annotate(screen_shot)
+        interactable_nodes, self.app_view_strs = scan if scan is not None else scan_ui_hierarchy(ui_hierarchy)
+        self.interactable_views = self.__init_interactable_view(interactable_nodes)
+        self.ui_fingerprint = fingerprint(self.get_ui_hierarchy_str())
+        self.state_hash = get_state_hash(self.ui_fingerprint, self.unmatched_s2rs, self.remaining_missing_steps)
+        self._id_str = None
+        self.orig_screen_shot = screen_shot  # None if visuals are disabled
+        self.annotations = []  # cv drawing ops applied when the screenshot is rendered
         self.available_actions = self.__init_actions()
+        self.action_rewards = {}  # action hash -> reward, shared by all observations of the state
+
+    def observe(self, ui_hierarchy, screen_shot):
+        # a new observation of this state: views, actions and rewards are reused, only hierarchy and screenshot are fresh
+        state = copy(self)
+        state.ui_hierarchy = ui_hierarchy
+        state.orig_screen_shot = screen_shot
+        state.annotations = []
+        return state
 
-    def __init_interactable_view(self):
-        common_filter = {
-            "enabled": "true",
-            "package": lambda x: x == pkg_name,
-            "visible-to-user": "true"
-        }
-        not_viewgroup_filter = {
-            "class": lambda x: x not in viewGroupClasses
-        }
-        clickables = self.ui_hierarchy.find_all(attrs={"clickable": "true", **common_filter, **not_viewgroup_filter})
-        long_clickables = self.ui_hierarchy.find_all(
-            attrs={"long-clickable": "true", **common_filter, **not_viewgroup_filter})
-        scrollables = self.ui_hierarchy.find_all(
-            attrs={"scrollable": "true", **common_filter, "class": lambda x: not x.endswith("ViewPager")})
-        swipables = self.ui_hierarchy.find_all(
-            attrs={"class": lambda x: x is not None and x.endswith("ViewPager"), **common_filter})
-
-        permission_button_rsc_id = ['com.android.packageinstaller:id/permission_allow_button',
-                                    'com.android.packageinstaller:id/permission_deny_button']
-
-        permission_buttons = self.ui_hierarchy.find_all(
-            attrs={"resource-id": lambda x: x in permission_button_rsc_id}
-        )
-
-        interactables = set(clickables + long_clickables + scrollables + swipables + permission_buttons)
-
-        if len(interactables) != 0:
-            interactables.add(back_view_Tag)
+    def __init_interactable_view(self, interactable_nodes):
+        if len(interactable_nodes) != 0:
+            interactables = [self.__create_view_record(view) for view in interactable_nodes]
+            interactables.append(self.__create_view_record(back_view_Tag))
             return interactables
         else:
             return []  # in this case, the app is not the current app.
 
+    def __create_view_record(self, view):
+        return ViewRecord(view, get_view_capabilities(view), tuple(parse_uiautomator_location(view['bounds'])))
+
     def obtain_available_actions(self):
         return self.available_actions
 
@@ -71,10 +109,13 @@ class State:
                 actions = self.generate_action(view, S2R(empty_s2r))
                 action_candidates = action_candidates + actions
         for s2r in self.unmatched_s2rs:
+            enabled_overlay = set()
             if enable_action_type_tweak:
                 for view in self.interactable_views:
-                    s2r.tweak_ui_action(view)
-            decomposed_s2rs = s2r.decompose_s2r()
+                    position = s2r.tweak_ui_action(view)
+                    if position is not None:
+                        enabled_overlay.add(position)
+            decomposed_s2rs = s2r.decompose_s2r(frozenset(enabled_overlay))
             for s2r_ in decomposed_s2rs:
                 for view in self.interactable_views:
                     actions = self.generate_action(view, s2r_)
@@ -90,51 +131,55 @@ class State:
                 action_candidates = []
         return action_candidates
 
-    def generate_action(self, view, s2r: S2R) -> List[Action]:
+    def generate_action(self, view: ViewRecord, s2r: S2R) -> List[Action]:
         random_input_value = compute_input_value()
         generated_actions = []
+
+        def _event(action, **kwargs):
+            return Event(view, action, **kwargs)
+
         if s2r.is_noop_s2r():
             # it's a no-op, need to infer UI action according to the view. Only infer CLICK, LONG-CLICK, BACK, INPUT, SCROLL. Not ROTATE and SWIPE.
-            if is_clickable_view(view):  # could be a click event
-                if is_back_view(view):
-                    event = Event(view, "BACK", self.orig_screen_shot)
+            if view.is_clickable():  # could be a click event
+                if view.is_back():
+                    event = _event("BACK")
                 else:
-                    event = Event(view, "CLICK", self.orig_screen_shot)
+                    event = _event("CLICK")
                 generated_actions.append(Action(event, s2r))
-            if is_editable_view(view) and is_not_filled_by_default_text(view):  # could be a input event and is not be matched with noop before (avoid inject duplicate noop s2r)
+            if view.is_editable() and is_not_filled_by_default_text(view):  # could be a input event and is not be matched with noop before (avoid inject duplicate noop s2r)
                 inferred_input_value = random_input_value
-                event = Event(view, "INPUT", self.orig_screen_shot, input_value=inferred_input_value)
+                event = _event("INPUT", input_value=inferred_input_value)
                 generated_actions.append(Action(event, s2r))
-            if is_long_clickable_view(view):  # could be a long-click event:
-                event = Event(view, "LONG CLICK", self.orig_screen_shot)
+            if view.is_long_clickable():  # could be a long-click event:
+                event = _event("LONG CLICK")
                 generated_actions.append(Action(event, s2r))
-            # if is_swipable_view(view):
-            #     event = Event(view,"SWIPE", self.orig_screen_shot)
+            # if view.is_swipable():
+            #     event = _event("SWIPE")
             #     generated_actions.append(Action(event, s2r))
-            if is_scrollable_view(view):
-                event = Event(view, "SCROLL", self.orig_screen_shot)
+            if view.is_scrollable():
+                event = _event("SCROLL")
                 generated_actions.append(Action(event, s2r))
         elif s2r.get_first_ui_action_type() == "ROTATE":
-            event = Event(view, "ROTATE", self.orig_screen_shot)
+            event = _event("ROTATE")
             generated_actions.append(Action(event, s2r))
-        elif s2r.get_first_ui_action_type() == "INPUT" and is_editable_view(view):
+        elif s2r.get_first_ui_action_type() == "INPUT" and view.is_editable():
             input_value = random_input_value if s2r.get_input_value() == "" else s2r.get_input_value()
-            event = Event(view, s2r.get_first_ui_action_type(), self.orig_screen_shot, input_value=input_value)
+            event = _event(s2r.get_first_ui_action_type(), input_value=input_value)
             generated_actions.append(Action(event, s2r))
-        elif s2r.get_first_ui_action_type() == "LONG CLICK" and is_long_clickable_view(view):
-            event = Event(view, "LONG CLICK", self.orig_screen_shot)
+        elif s2r.get_first_ui_action_type() == "LONG CLICK" and view.is_long_clickable():
+            event = _event("LONG CLICK")
             generated_actions.append(Action(event, s2r))
-        elif s2r.get_first_ui_action_type() == "CLICK" and is_clickable_view(view):
-            if is_back_view(view):
-                event = Event(view, "BACK", self.orig_screen_shot)
+        elif s2r.get_first_ui_action_type() == "CLICK" and view.is_clickable():
+            if view.is_back():
+                event = _event("BACK")
             else:
-                event = Event(view, "CLICK", self.orig_screen_shot)
+                event = _event("CLICK")
             generated_actions.append(Action(event, s2r))
-        elif s2r.get_first_ui_action_type() == "SWIPE" and is_swipable_view(view):
-            event = Event(view, "SWIPE", self.orig_screen_shot, swipe_direction=s2r.get_swipe_direction())
+        elif s2r.get_first_ui_action_type() == "SWIPE" and view.is_swipable():
+            event = _event("SWIPE", swipe_direction=s2r.get_swipe_direction())
             generated_actions.append(Action(event, s2r))
-        elif s2r.get_first_ui_action_type() == "SCROLL" and is_scrollable_view(view):
-            event = Event(view, "SCROLL", self.orig_screen_shot, scroll_direction=s2r.get_scroll_direction())
+        elif s2r.get_first_ui_action_type() == "SCROLL" and view.is_scrollable():
+            event = _event("SCROLL", scroll_direction=s2r.get_scroll_direction())
             generated_actions.append(Action(event, s2r))
         return generated_actions
 
@@ -147,61 +192,56 @@ class State:
         self.dump_screen_shot(screen_shot_file)
 
     def dump_screen_shot(self, screen_shot_file):
-        dump_cv_img(self.screen_shot, screen_shot_file)
+        if self.orig_screen_shot is None:
+            return
+        dump_cv_img(self.render_screen_shot(), screen_shot_file)
+
+    def render_screen_shot(self):
+        # the annotated screenshot is only drawn when it is written
+        screen_shot = self.annotate(self.orig_screen_shot.copy())
+        for text, org in self.annotations:
+            screen_shot = cv.putText(screen_shot, text, org, cv.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), thickness=5)
+        return screen_shot
 
     def __eq__(self, other):
         if isinstance(other, State):
-            return self.__hash__() == other.__hash__()
+            return self.state_hash == other.state_hash
         else:
             return False
 
     def get_ui_hierarchy_str(self):
-        def _display_time_point(view):
-            text = view['text']
-            match_result = re.match('((1[0-2]|0?[1-9]):([0-5][0-9]) ?([AaPp][Mm]))', text)
-            return match_result is not None
-
-        def _clean_attrs(i):
-            attrs = dict(i.attrs)
-            if _display_time_point(attrs):
-                attrs['text'] = ''
-            for attr_tb_del in ["focused"]:
-                del attrs[attr_tb_del]
-            return attrs
-
-        related_elements = self.ui_hierarchy.find_all(
-            attrs={"package": lambda x: x in [pkg_name, "com.google.android.packageinstaller"]})
-        view_strs = [
-            # f"{i['bounds']} {i['checkable']} {i['clickable']} {i['content-desc']} {i['focusable']} {i['long-clickable']} {i['password']} {i['resource-id']} {i['scrollable']} {i['text']}"
-            str(_clean_attrs(i))
-            for i in related_elements
-            if len(list(i.children)) == 0
-        ]
-        view_strs.sort()
+        view_strs = sorted(self.app_view_strs)
         app_views_str = " ".join(view_strs)
         return app_views_str
 
-    def get_id_str(self):
+    @property
+    def id_str(self):
+        # only needed when dumping the hash map, so it is built on demand
+        if self._id_str is None:
+            self._id_str = self.get_id_str()
+        return self._id_str
 
-        s2r_indexs = [str(s2r.get_index()) for s2r in self.unmatched_s2rs]
-        s2r_indexs.sort()
+    def get_id_str(self):
         app_views_str = self.get_ui_hierarchy_str()
-        unmatched_s2r_str = " ".join(s2r_indexs)
+        unmatched_s2r_str = get_unmatched_s2r_str(self.unmatched_s2rs)
         whole_str = app_views_str + " " + unmatched_s2r_str + " " + str(self.remaining_missing_steps)
         return whole_str
 
+    def same_ui(self, other):
+        return self.ui_fingerprint == other.ui_fingerprint
+
     def __hash__(self):
-        return int(hashlib.md5(self.id_str.encode()).hexdigest(), 16)
+        return self.state_hash
 
     def annotate(self, screen_shot):
         for view in self.interactable_views:
-            x_1, y_1, x_2, y_2 = parse_uiautomator_location(view['bounds'])
+            x_1, y_1, x_2, y_2 = view.bounds
             color = (255, 0, 0)  # blue
-            if is_clickable_view(view) or is_long_clickable_view(view):
+            if view.is_clickable() or view.is_long_clickable():
                 color = (237, 233, 17)  # light blue
-            if is_editable_view(view):
+            if view.is_editable():
                 color = (17, 237, 57)  # green
-            if is_scrollable_view(view) or is_swipable_view(view):
+            if view.is_scrollable() or view.is_swipable():
                 color = (0, 255, 255)  # yellow
             screen_shot = cv.rectangle(screen_shot, (x_1, y_1), (x_2, y_2), color=color, thickness=2)
         cv.putText(screen_shot, f"s: {str(self.__hash__())}", (50, 60), cv.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255),
@@ -211,13 +251,10 @@ class State:
         return screen_shot
 
     def annotate_exploration(self, text):
-        self.screen_shot = cv.putText(self.screen_shot, text, (50, 240), cv.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255),
-                                      thickness=5)
+        self.annotations.append((text, (50, 240)))
 
     def annotate_action(self, action):
         xy = action.ui_event.get_xy()
         selected_s2r_index = action.s2r.get_index()
-        self.screen_shot = cv.putText(self.screen_shot, "s2r: " + str(selected_s2r_index), xy, cv.FONT_HERSHEY_SIMPLEX,
-                                      2, (0, 0, 255), thickness=5)
-        self.screen_shot = cv.putText(self.screen_shot, "a:" + str(action.__hash__()), (50, 180),
-                                      cv.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), thickness=5)
+        self.annotations.append(("s2r: " + str(selected_s2r_index), xy))
+        self.annotations.append(("a:" + str(action.__hash__()), (50, 180)))
@@ -0,0 +1,55 @@
+from utils.utils import VIEW_CLICKABLE, VIEW_LONG_CLICKABLE, VIEW_EDITABLE, VIEW_SCROLLABLE, VIEW_SWIPABLE, VIEW_BACK, \
+    get_text_from_view, get_content_description_from_view, get_resource_id_from_view
+
+
+class FrozenRecord:
+    # base of the immutable __slots__ records, fields are only set once in __init__ through _set
+    __slots__ = ()
+
+    def _set(self, name, value):
+        object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):  # used by pickle and copy
+        for name, value in state.items():
+            self._set(name, value)
+
+
+class ViewRecord(FrozenRecord):
+    # an interactable view of a state, everything ReproBot reads from the view is extracted once from the hierarchy node
+    __slots__ = ("attrs", "capabilities", "bounds", "texts", "content_description", "resource_id_name", "hash_str")
+
+    def __init__(self, view, capabilities, bounds):
+        self._set("attrs", dict(view.attrs))
+        self._set("capabilities", capabilities)
+        self._set("bounds", bounds)
+        self._set("texts", tuple(get_text_from_view(view)))  # needs the node for the text of siblings and children
+        self._set("content_description", get_content_description_from_view(view))
+        self._set("resource_id_name", get_resource_id_from_view(view))
+        self._set("hash_str", str(self.attrs))
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def is_clickable(self):
+        return self.capabilities & VIEW_CLICKABLE != 0
+
+    def is_long_clickable(self):
+        return self.capabilities & VIEW_LONG_CLICKABLE != 0
+
+    def is_editable(self):
+        return self.capabilities & VIEW_EDITABLE != 0
+
+    def is_scrollable(self):
+        return self.capabilities & VIEW_SCROLLABLE != 0
+
+    def is_swipable(self):
+        return self.capabilities & VIEW_SWIPABLE != 0
+
+    def is_back(self):
+        return self.capabilities & VIEW_BACK != 0
@@ -1,5 +1,7 @@
+import hashlib
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join
 
 import adbutils.errors
@@ -7,37 +9,52 @@ import cv2
 import numpy as np
 import uiautomator2
 import uiautomator2 as u2
-from bs4 import BeautifulSoup
 from uiautomator2 import RetryError, UiObjectNotFoundError, GatewayError
 from urllib3.exceptions import ReadTimeoutError
 
 from rl_module.components.s2r import S2R
+from rl_module.components.state_cache import StateCache
 from rl_module.components.state_obj import State
-from rl_module.environment.reward_calculator import calculate_reward
+from rl_module.environment.frontier_archive import FrontierArchive
+from rl_module.environment.latency_stats import StepLatencyStats
+from rl_module.environment.logcat_monitor import LogcatMonitor
+from rl_module.environment.reset_engine import ResetEngine
+from rl_module.environment.snapshot_cache import get_setup_files
+from rl_module.environment.reward_calculator import get_action_reward
 from rl_module.environment.telnet_wrapper import TelnetWrapper
 from utils.cmd_args import crash_log, device_id, adb_port, setup_apk, setup_test_apk, setup_apk_pkg, \
-    setup_test_apk_pkg, apk_file_path
-from utils.config import app_name, pkg_name, snapshot, logcat_dir
-from utils.nlp_util import parse_uiautomator_location
-from utils.setup_run import run
-from utils.utils import read_json, get_logger, restart_adb, dump_file
-from copy import deepcopy
+    setup_test_apk_pkg, apk_file_path, no_visuals, setup_script
+from utils.config import app_name, pkg_name, snapshot, logcat_dir, ui_hierarchy_parser, rl_running_log_dir, \
+    settle_min_wait, settle_poll_interval, settle_timeout, state_cache_size, reset_strategies, auto_setup_snapshot, \
+    frontier_max_size
+from utils.ui_hierarchy import parse_ui_hierarchy, EMPTY_HIERARCHY
+from utils.utils import read_json, get_logger, restart_adb, dump_file, load_setup_run
 
 logger = get_logger("environment")
+run = load_setup_run(setup_script)
 
 
 class App_Env:
     def __init__(self, s2r_file, total_missing_step):
         self.s2rs = self.load_s2rs(s2r_file)
-        self.unmatched_s2r = deepcopy(self.s2rs)
+        self.matched_s2r_indexes = frozenset()  # progress of the epoch, the S2Rs themselves are shared and immutable
         self.app_pid = None
         self.total_missing_step = total_missing_step
         self.remaining_missing_steps = total_missing_step
         self.cur_orientation = 'natural'
+        self.window_sizes = {}  # orientation -> (width, height)
         self.telnet = TelnetWrapper(adb_port)
         self.connect_uiautomator()
         logger.info(f"Telnet connected to emulator.")
+        setup_files = get_setup_files(setup_apk, setup_test_apk, setup_script) if auto_setup_snapshot else None
+        self.reset_engine = ResetEngine(self.d, self.telnet, pkg_name, apk_file_path, snapshot, reset_strategies,
+                                        setup_files)
         self.setup_apk_start_time = 0
+        self.screen_shot_executor = ThreadPoolExecutor(max_workers=1)  # screenshots are fetched while the hierarchy is parsed
+        self.latency_stats = StepLatencyStats(join(rl_running_log_dir, "step_latency.csv"))
+        self.state_cache = StateCache(state_cache_size)
+        self.logcat_monitor = LogcatMonitor(device_id, crash_log)
+        self.frontier = FrontierArchive(self.telnet, pkg_name, frontier_max_size)
 
     def print_device_info(self):
         logger.debug("Trying to connect to uiautomator")
@@ -95,58 +112,93 @@ class App_Env:
             self.d.uiautomator.start()
             time.sleep(2)
 
-    def start_app_load_snapshot(self):
-        self.telnet.load_snapshot(snapshot)
-
     # start/restart the app
     def stat_app(self):
         setup_start = time.time()
-        if pkg_name in self.d.app_list():
-            self.d.app_uninstall(pkg_name)
-        self.d.app_install(apk_file_path)
-        if snapshot is not None:
-            self.start_app_load_snapshot()
-        elif setup_apk is not None and setup_test_apk is not None:
-            self.start_setup_apk()
+        strategy = self.reset_engine.reset()
+        if strategy != "snapshot":  # a snapshot already contains the set up app
+            if setup_apk is not None and setup_test_apk is not None:
+                self.start_setup_apk()
+            else:
+                self.d.app_start(pkg_name,use_monkey=True)
+                self.d.app_wait(pkg_name,front=True)
+                time.sleep(1)
+                run(self.d, pkg_name)
+                time.sleep(1)
+            self.print_device_info()
+            self.reset_engine.save_setup_snapshot()
         else:
-            self.d.app_start(pkg_name,use_monkey=True)
-            self.d.app_wait(pkg_name,front=True)
-            time.sleep(1)
-            run(self.d, pkg_name)
-            time.sleep(1)
-        self.print_device_info()
+            self.print_device_info()
         setup_end = time.time()
         logger.info("Setup delay: %s" % (setup_end - setup_start))
 
-    def cur_state(self):
-        # time.sleep(2)  # wait the app started or the action finished before dumping the state
+    def dump_hierarchy(self):
         retry_time = 10
-        xml = None
         while retry_time > 0:
-            time.sleep(1.5)
             try:
-                xml = self.d.dump_hierarchy()  # return the hierarchy in xml string
-                break
+                return self.d.dump_hierarchy()  # return the hierarchy in xml string
             except Exception as e:
                 logger.error("Cannot dump hierarchy. Try again..")
                 retry_time -= 1
+                time.sleep(settle_poll_interval)
+        return None
+
+    def dump_settled_hierarchy(self):
+        # poll the hierarchy until two consecutive dumps are identical or the timeout is hit. From the second dump on the
+        # screenshot is fetched along with each dump, so it is ready when a dump confirms the previous one
+        time.sleep(settle_min_wait)
+        deadline = time.time() + settle_timeout
+        xml = None
+        last_digest = None
+        dumps = 0
+        screen_shot_future = None
+        while True:
+            if last_digest is not None and not no_visuals and (screen_shot_future is None or screen_shot_future.done()):
+                screen_shot_future = self.screen_shot_executor.submit(self.get_screen_shot)
+            new_xml = self.dump_hierarchy()
+            dumps += 1
+            if new_xml is None:  # the last good dump, None if the first one failed
+                return xml, dumps, False, None
+            xml = new_xml
+            digest = hashlib.blake2b(xml.encode(), digest_size=8).digest()
+            if digest == last_digest:
+                return xml, dumps, True, screen_shot_future
+            if screen_shot_future is not None and screen_shot_future.cancel():  # not started, the UI is changing
+                screen_shot_future = None
+            if time.time() + settle_poll_interval > deadline:
+                logger.debug(f"UI did not settle within {settle_timeout}s")
+                return xml, dumps, False, None
+            last_digest = digest
+            time.sleep(settle_poll_interval)
+
+    def cur_state(self):
+        start = time.time()
+        xml, dumps, settled, screen_shot_future = self.dump_settled_hierarchy()
+        settle_end = time.time()
+        if screen_shot_future is None and not no_visuals:
+            screen_shot_future = self.screen_shot_executor.submit(self.get_screen_shot)
         if xml is None:
             logger.error("Failed to capture VH, Created a empty one as replace")
-            xml = '<?xml version="1.0" encoding="utf-8"?><hierarchy rotation="0"></hierarchy>'  # an empty xml
-        state_xml = BeautifulSoup(xml, 'xml')
-        screen_shot = self.get_screen_shot()
-        return State(state_xml, deepcopy(self.unmatched_s2r), self.remaining_missing_steps, screen_shot)
+            xml = EMPTY_HIERARCHY  # an empty xml
+        state_xml = parse_ui_hierarchy(xml, ui_hierarchy_parser)
+        wait_start = time.time()
+        screen_shot = None if screen_shot_future is None else screen_shot_future.result()
+        wait_end = time.time()
+        state = self.state_cache.get_state(state_xml, self.unmatched_s2r, self.remaining_missing_steps, screen_shot)
+        end = time.time()
+        self.latency_stats.record(settle_end - start, dumps, settled, wait_end - wait_start,
+                                  (wait_start - settle_end) + (end - wait_end), end - start)
+        return state
 
     # execute the action using controller and return the next state as well as the reward
-    def execute_action(self, action):
-        reward = calculate_reward(action, self.d.window_size())
+    def execute_action(self, action, cur_state: State):
+        reward = get_action_reward(cur_state, action, self.window_size())
         # execute ui event onto app
         self.execute_ui_event(action.ui_event)
 
         # modify unmatched s2r
-        s2r_to_be_removed = [i for i in self.unmatched_s2r if i.get_index() == action.s2r.get_index()]
-        for s2r in s2r_to_be_removed:
-            self.unmatched_s2r.remove(s2r)
+        if not action.matched_with_empty_s2r():
+            self.matched_s2r_indexes = self.matched_s2r_indexes | {action.s2r.get_index()}
 
         if action.matched_with_empty_s2r():
             self.remaining_missing_steps -= 1
@@ -186,14 +238,14 @@ class App_Env:
         elif event_action == "LONG CLICK":
             self.d.long_click(tgt_x, tgt_y, duration=1)
         elif event_action in ["SWIPE", "SCROLL"]:
-            x_1, y_1, x_2, y_2 = parse_uiautomator_location(scroll_or_swipe_range)
+            x_1, y_1, x_2, y_2 = scroll_or_swipe_range
             self.d.swipe(x_1, y_1, x_2, y_2)
 
     def execute_ui_event(self, event):
         tgt_x, tgt_y = event.get_xy()
         resource_id = event.get_resource_id()
         self.interact_with_app(tgt_x, tgt_y, event.action, resource_id, event.input_value,
-                               event.get_scroll_or_swipe_range())
+                               event.get_scroll_or_swipe_points())
 
     def check_termination(self, next_state: State):
         crashed = self.is_crashed(next_state)
@@ -217,16 +269,14 @@ class App_Env:
         return len(android_texts) != 0
 
     def clear_logcat(self):
-        self.d.shell("logcat -c")
+        self.logcat_monitor.clear()
 
     def show_crash_in_log(self):
-        log = self.d.shell("logcat -d")
-        fatal_in = "FATAL" in log.output or "ACRA caught a"  # some app used ACRA to catch report which would not be thrown to the system level such like: recdrod-30 or recdroid-64
-        crash_log_in = crash_log in log.output
-        if fatal_in and not crash_log_in:
+        # the crash signature is matched by the logcat monitor while the log streams in
+        crash_log_in = self.logcat_monitor.crashed()
+        if self.logcat_monitor.fatal_seen and not crash_log_in:
             logger.info("Triggered a crash, but not the same with bug report")
-        match_crash = fatal_in and crash_log_in
-        return match_crash
+        return crash_log_in
 
     def is_crashed(self, cur_state) -> bool:
         # running_app = self.d.app_list_running()
@@ -235,6 +285,12 @@ class App_Env:
         app_crashed = self.show_crash_in_log()
         return app_crashed
 
+    def window_size(self):
+        # the window size only changes with the orientation, so the device is asked once per orientation
+        if self.cur_orientation not in self.window_sizes:
+            self.window_sizes[self.cur_orientation] = self.d.window_size()
+        return self.window_sizes[self.cur_orientation]
+
     def get_screen_shot(self):
         try:
             screenshot = self.d.screenshot(format='opencv')
@@ -242,28 +298,49 @@ class App_Env:
                 raise cv2.error
             return screenshot
         except cv2.error or IOError or ReadTimeoutError as e:
-            w, h = self.d.window_size()
+            w, h = self.window_size()
             fake_img = np.zeros((h, w), np.uint8)
             fake_img.fill(255)
             return fake_img
 
     def refresh_env(self):
-        self.unmatched_s2r = deepcopy(self.s2rs)
+        self.matched_s2r_indexes = frozenset()
         self.remaining_missing_steps = self.total_missing_step
         self.d.press('home')
         self.d.set_orientation("n")  # refresh orientation back to normal
+        self.cur_orientation = 'natural'
         self.stat_app()
         self.clear_logcat()
 
+    def restore_frontier(self, entry):
+        # start the epoch at an archived state instead of the initial screen, False if its snapshot cannot be loaded
+        if not self.frontier.restore(entry):
+            return False
+        self.matched_s2r_indexes = entry.matched_s2r_indexes
+        self.remaining_missing_steps = entry.remaining_missing_steps
+        self.cur_orientation = entry.orientation
+        self.clear_logcat()
+        logger.info(f"Restored frontier state {entry.state_hash}")
+        return True
+
     def stop_app(self):
         self.d.app_stop(pkg_name)
 
+    def close(self):
+        self.screen_shot_executor.shutdown()
+        self.logcat_monitor.stop()
+        self.frontier.clear()
+
     def dump_logcat(self, epoch, step):
-        log = self.d.shell("logcat -d")
+        log = self.logcat_monitor.pop_step_log()  # only the lines logged since the previous step
         logcat_file = join(logcat_dir, f"epoch_{epoch}_step_{step}.txt")
-        dump_file(log.output, logcat_file)
+        dump_file(log, logcat_file)
+
+    @property
+    def unmatched_s2r(self):
+        return tuple(s2r for s2r in self.s2rs if s2r.get_index() not in self.matched_s2r_indexes)
 
     def load_s2rs(self, s2r_file):
         s2rs = read_json(s2r_file)
-        s2r_objs = [S2R(s2r) for s2r in s2rs]
+        s2r_objs = tuple(S2R(s2r) for s2r in s2rs)
         return s2r_objs
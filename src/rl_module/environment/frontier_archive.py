@@ -0,0 +1,72 @@
+import math
+import random
+import re
+
+from utils.utils import get_logger
+
+logger = get_logger("frontier-archive")
+
+
+class FrontierEntry:
+    def __init__(self, state_hash, snapshot, matched_s2r_indexes, remaining_missing_steps, orientation, action_prefix):
+        self.state_hash = state_hash
+        self.snapshot = snapshot
+        self.matched_s2r_indexes = matched_s2r_indexes
+        self.remaining_missing_steps = remaining_missing_steps
+        self.orientation = orientation
+        self.action_prefix = action_prefix  # dicts of the actions that led to the state, for the success output
+        self.restores = 0
+
+    def weight(self):
+        # prefer states with more matched S2Rs, and states that were restored less often
+        return (1 + len(self.matched_s2r_indexes)) / math.sqrt(1 + self.restores)
+
+
+class FrontierArchive:
+    # Go-Explore style archive of the states where S2Rs were matched, each backed by an emulator snapshot, so an
+    # epoch can start at a matched prefix instead of replaying it on the device
+    def __init__(self, telnet, pkg_name, max_size):
+        self.telnet = telnet
+        self.max_size = max_size
+        self.snapshot_prefix = "reprobot_frontier_" + re.sub(r"\W", "_", pkg_name) + "_"
+        self.entries = {}
+
+    def try_add(self, state, env, action_prefix):
+        state_hash = state.__hash__()
+        if state_hash in self.entries or len(state.obtain_available_actions()) == 0:
+            return False
+        if len(self.entries) >= self.max_size:
+            weakest = min(self.entries.values(), key=lambda e: (len(e.matched_s2r_indexes), -e.restores))
+            if len(weakest.matched_s2r_indexes) >= len(env.matched_s2r_indexes):
+                return False
+            self.remove(weakest)
+        snapshot = self.snapshot_prefix + str(state_hash)
+        if not self.telnet.save_snapshot(snapshot):
+            logger.error(f"Failed to save frontier snapshot {snapshot}")
+            return False
+        self.entries[state_hash] = FrontierEntry(state_hash, snapshot, env.matched_s2r_indexes,
+                                                 env.remaining_missing_steps, env.cur_orientation, list(action_prefix))
+        logger.info(f"Archived frontier state {state_hash} with {len(env.matched_s2r_indexes)} matched S2Rs")
+        return True
+
+    def select(self):
+        if len(self.entries) == 0:
+            return None
+        entries = list(self.entries.values())
+        return random.choices(entries, weights=[e.weight() for e in entries])[0]
+
+    def restore(self, entry):
+        entry.restores += 1
+        if not self.telnet.load_snapshot(entry.snapshot):
+            logger.error(f"Failed to load frontier snapshot {entry.snapshot}, dropping it")
+            self.remove(entry)
+            return False
+        return True
+
+    def remove(self, entry):
+        self.telnet.delete_snapshot(entry.snapshot)
+        self.entries.pop(entry.state_hash, None)
+
+    def clear(self):
+        for entry in list(self.entries.values()):
+            self.remove(entry)
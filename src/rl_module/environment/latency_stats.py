@@ -0,0 +1,49 @@
+import csv
+from os.path import exists
+
+import numpy as np
+
+from utils.utils import get_logger
+
+logger = get_logger("latency-stats")
+
+LATENCY_FIELDS = ["epoch", "step", "settle", "dumps", "settled", "screenshot_wait", "state_build", "total"]
+
+
+class StepLatencyStats:
+    # latency of each state observation, one csv row per step, used to tune the settle thresholds
+    def __init__(self, csv_file=None):
+        self.csv_file = csv_file
+        self.records = []
+        self.epoch = 0
+        self.step = 0
+
+    def set_step(self, epoch, step):
+        self.epoch = epoch
+        self.step = step
+
+    def record(self, settle, dumps, settled, screenshot_wait, state_build, total):
+        row = [self.epoch, self.step, round(settle, 4), dumps, settled, round(screenshot_wait, 4),
+               round(state_build, 4), round(total, 4)]
+        self.records.append(row)
+        logger.debug(f"Observation latency: {dict(zip(LATENCY_FIELDS, row))}")
+        if self.csv_file is not None:
+            new_file = not exists(self.csv_file)
+            with open(self.csv_file, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(LATENCY_FIELDS)
+                writer.writerow(row)
+
+    def log_stats(self):
+        if len(self.records) == 0:
+            return
+        records = np.array([[r[2], r[3], r[5], r[6], r[7]] for r in self.records], dtype=float)
+        unsettled = sum(1 for r in self.records if not r[4])
+        summary = []
+        for i, name in enumerate(["settle", "dumps", "screenshot_wait", "state_build", "total"]):
+            col = records[:, i]
+            summary.append(f"{name} mean={col.mean():.3f} p50={np.percentile(col, 50):.3f} "
+                           f"p95={np.percentile(col, 95):.3f} max={col.max():.3f}")
+        logger.info(f"Observation latency over {len(self.records)} steps ({unsettled} hit the settle timeout): "
+                    + "; ".join(summary))
@@ -0,0 +1,77 @@
+import subprocess
+import threading
+
+from utils.config import ADB_CMD
+from utils.utils import get_logger
+
+logger = get_logger("logcat-monitor")
+
+FATAL_MARKERS = ["FATAL", "ACRA caught a"]  # some app used ACRA to catch report which would not be thrown to the system level such like: recdrod-30 or recdroid-64
+
+
+class LogcatMonitor:
+    # keeps one `adb logcat` stream open and matches the crash signature while the lines arrive
+    def __init__(self, device_id, crash_signature):
+        self.device_id = device_id
+        self.crash_signature = crash_signature
+        self.lock = threading.Lock()
+        self.process = None
+        self.reader = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.step_lines = []  # lines since the last pop_step_log
+            self.tail = ""  # end of the stream kept to match signatures spanning several lines
+            self.fatal_seen = False
+            self.crash_matched = False
+
+    def adb(self, *args):
+        return [ADB_CMD, "-s", self.device_id, *args]
+
+    def start(self):
+        self.process = subprocess.Popen(self.adb("logcat"), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        universal_newlines=True, errors="replace", bufsize=1)
+        self.reader = threading.Thread(target=self.__read_lines, args=(self.process,), daemon=True)
+        self.reader.start()
+
+    def stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.reader.join(timeout=5)
+            self.process = None
+
+    def clear(self):
+        # restart the stream on the cleared buffer, so lines of the previous epoch are never read
+        self.stop()
+        subprocess.run(self.adb("logcat", "-c"), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.reset()
+        self.start()
+
+    def __read_lines(self, process):
+        for line in process.stdout:
+            with self.lock:
+                self.step_lines.append(line)
+                self.__match(line)
+
+    def __match(self, line):
+        if not self.fatal_seen and any(marker in line for marker in FATAL_MARKERS):
+            self.fatal_seen = True
+        if self.crash_signature and not self.crash_matched:
+            window = self.tail + line
+            if self.crash_signature in window:
+                self.crash_matched = True
+            self.tail = window[-(len(self.crash_signature) - 1):] if len(self.crash_signature) > 1 else ""
+
+    def crashed(self):
+        return self.crash_matched
+
+    def pop_step_log(self):
+        if self.process is not None and self.process.poll() is not None:
+            logger.error("Logcat stream stopped, restarting it..")
+            self.start()
+        with self.lock:
+            lines = self.step_lines
+            self.step_lines = []
+        return "".join(lines)
@@ -0,0 +1,92 @@
+import time
+
+from rl_module.environment.snapshot_cache import SnapshotCache
+from utils.utils import get_logger, file_hash
+
+logger = get_logger("reset-engine")
+
+RESET_STRATEGIES = ["snapshot", "clear", "reinstall"]
+
+
+class ResetEngine:
+    # brings the app under test back to its initial state at the start of an epoch. The configured strategies are
+    # tried in order and the next one is used when a strategy is not applicable or fails
+    def __init__(self, d, telnet, pkg_name, apk_file_path, snapshot, strategies, setup_files=None):
+        unknown = [s for s in strategies if s not in RESET_STRATEGIES]
+        if len(unknown) != 0:
+            raise Exception(f"Unknown reset strategies {unknown}, available: {RESET_STRATEGIES}")
+        self.d = d
+        self.telnet = telnet
+        self.pkg_name = pkg_name
+        self.apk_file_path = apk_file_path
+        self.snapshot = snapshot
+        self.strategies = strategies
+        self.apk_hash = file_hash(apk_file_path)
+        self.installed_apk_hash = None  # hash of the apk this engine installed on the device
+        self.snapshot_cache = None  # used when no snapshot is given by the user
+        if snapshot is None and setup_files is not None and "snapshot" in strategies:
+            self.snapshot_cache = SnapshotCache(telnet, pkg_name, self.apk_hash, setup_files)
+        self.stats = {strategy: {"count": 0, "failures": 0, "time": 0.0} for strategy in RESET_STRATEGIES}
+
+    def reset(self):
+        for strategy in self.strategies:
+            if not self.is_applicable(strategy):
+                continue
+            start = time.time()
+            try:
+                getattr(self, "reset_by_" + strategy)()
+                succeeded = True
+            except Exception as e:
+                logger.error(f"Reset by {strategy} failed: {e}")
+                succeeded = False
+            stats = self.stats[strategy]
+            stats["time"] += time.time() - start
+            if succeeded:
+                stats["count"] += 1
+                logger.info(f"Reset by {strategy} in {time.time() - start:.2f}s")
+                return strategy
+            stats["failures"] += 1
+        raise Exception(f"All reset strategies failed: {self.strategies}")
+
+    def is_applicable(self, strategy):
+        if strategy == "snapshot":
+            return self.snapshot is not None or (self.snapshot_cache is not None and self.snapshot_cache.available())
+        if strategy == "clear":
+            return self.installed_apk_hash == self.apk_hash
+        return True
+
+    def reset_by_snapshot(self):
+        self.installed_apk_hash = None  # the snapshot brings its own installation of the app
+        snapshot = self.snapshot if self.snapshot is not None else self.snapshot_cache.name
+        if not self.telnet.load_snapshot(snapshot):
+            if self.snapshot is None:
+                self.snapshot_cache.invalidate()
+            raise Exception(f"Failed to load snapshot {snapshot}. The snapshot may be lost or damaged")
+
+    def save_setup_snapshot(self):
+        # called once the app is set up, later epochs and runs load the snapshot instead of repeating the setup
+        if self.snapshot_cache is not None and not self.snapshot_cache.available():
+            self.snapshot_cache.save()
+
+    def reset_by_clear(self):
+        self.d.app_stop(self.pkg_name)
+        output = self.d.shell(["pm", "clear", self.pkg_name]).output
+        if "Success" not in output:
+            raise Exception(f"pm clear returned: {output.strip()}")
+
+    def reset_by_reinstall(self):
+        self.installed_apk_hash = None
+        if self.pkg_name in self.d.app_list():
+            self.d.app_uninstall(self.pkg_name)
+        self.d.app_install(self.apk_file_path)
+        self.installed_apk_hash = self.apk_hash
+
+    def log_stats(self):
+        summary = []
+        for strategy, stats in self.stats.items():
+            attempts = stats["count"] + stats["failures"]
+            if attempts == 0:
+                continue
+            summary.append(f"{strategy}: {stats['count']} resets, {stats['failures']} failures, "
+                           f"{stats['time'] / attempts:.2f}s per attempt")
+        logger.info("Reset stats: " + "; ".join(summary))
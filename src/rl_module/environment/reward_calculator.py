@@ -4,10 +4,52 @@ from utils.config import missing_step_penalty, textual_similarity_reward_on, rew
     failure_penalty, use_adhoc_reward_for_input, exploration_reward_on, \
     include_content_dsc_resource_id_similarity, enable_scroll_reward, scroll_default_reward, enable_swipe_reward, \
     swipe_default_reward, reward_bar, rotate_default_reward, enable_rotate_reward
-from utils.nlp_util import get_word_similarity
+from utils.nlp_util import get_word_similarity, SimilarityMatrix
 
 
 def calculate_reward(action: Action, screen_size):  # screen size will be in form of (width, height)
+    return compose_reward(action, get_word_similarity)
+
+
+def get_action_reward(state: State, action: Action, screen_size):
+    # rewards are memoized on the state by action hash, usually filled when the q-value of the action is initialized
+    action_hash = action.__hash__()
+    if action_hash not in state.action_rewards:
+        state.action_rewards[action_hash] = calculate_reward(action, screen_size)
+    return state.action_rewards[action_hash]
+
+
+def calculate_rewards(actions, screen_size):
+    # batch version of calculate_reward: all target words are scored against all view strings of the actions at once
+    target_words, view_strs = [], []
+    for action in actions:
+        if needs_textual_similarity(action):
+            target_words.append(action.s2r.get_target_word())
+            view_strs.extend(get_view_strs_for_similarity(action.ui_event))
+    if len(target_words) == 0:
+        return [calculate_reward(action, screen_size) for action in actions]
+    similarity_matrix = SimilarityMatrix(target_words, view_strs)
+    return [compose_reward(action, similarity_matrix.similarity) for action in actions]
+
+
+def needs_textual_similarity(action: Action):
+    event = action.ui_event
+    if action.matched_with_empty_s2r() or not textual_similarity_reward_on:
+        return False
+    if (event.action == "ROTATE" and enable_rotate_reward) or (event.action == "SCROLL" and enable_scroll_reward) or \
+            (event.action == "SWIPE" and enable_swipe_reward):
+        return False
+    return True
+
+
+def get_view_strs_for_similarity(event):
+    view_strs = list(event.get_text_on_target_view())
+    if include_content_dsc_resource_id_similarity:
+        view_strs.extend([event.get_resource_id_name(), event.get_content_description()])
+    return view_strs
+
+
+def compose_reward(action: Action, word_similarity):
     event = action.ui_event
     s2r = action.s2r
     reward = {}
@@ -24,20 +66,20 @@ def calculate_reward(action: Action, screen_size):  # screen size will be in for
             reward['input_adhoc_reward'] = 0.7
         if textual_similarity_reward_on:
             textual_similarity = max([
-                get_word_similarity(s2r.get_target_word(), text)
+                word_similarity(s2r.get_target_word(), text)
                 for text in event.get_text_on_target_view()
             ], default=0)
             reward['textual_similarity'] =  textual_similarity
             if include_content_dsc_resource_id_similarity:
-                resource_id_similarity = get_word_similarity(s2r.get_target_word(), event.get_resource_id_name())
-                content_description_similarity = get_word_similarity(s2r.get_target_word(), event.get_content_description())
+                resource_id_similarity = word_similarity(s2r.get_target_word(), event.get_resource_id_name())
+                content_description_similarity = word_similarity(s2r.get_target_word(), event.get_content_description())
                 reward['textual_similarity'] = max(resource_id_similarity, content_description_similarity, textual_similarity)
     reward['total'] = scale_reward_value(list(reward.values()))
     return reward
 
 
 def modify_reward_according_to_next_state(reward, cur_state: State, next_state: State):
-    if cur_state.get_ui_hierarchy_str() == next_state.get_ui_hierarchy_str() and exploration_reward_on:
+    if cur_state.same_ui(next_state) and exploration_reward_on:
         return failure_penalty # give a large penalty for action with no effect on the UI
     else:
         return reward
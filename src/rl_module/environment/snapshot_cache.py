@@ -0,0 +1,89 @@
+import hashlib
+import re
+import time
+from os import getpid, replace
+from os.path import exists, join
+
+import utils.setup_run
+from utils.config import cache_dir
+from utils.utils import get_logger, read_json, dump_json, file_hash
+
+logger = get_logger("snapshot-cache")
+
+SNAPSHOT_INDEX_FILE = join(cache_dir, "snapshots.json")
+
+
+def get_setup_files(setup_apk, setup_test_apk, setup_script=None):
+    # the inputs that decide the state of the app after setup, besides the apk under test
+    if setup_apk is not None and setup_test_apk is not None:
+        return [setup_apk, setup_test_apk]
+    return [setup_script if setup_script is not None else utils.setup_run.__file__]
+
+
+class SnapshotCache:
+    # an emulator snapshot saved after the first successful setup, named by the hash of the apk, the setup inputs and
+    # the AVD. Changing any of them gives a new name, and the stale snapshots of the app are deleted
+    def __init__(self, telnet, pkg_name, apk_hash, setup_files, index_file=SNAPSHOT_INDEX_FILE):
+        self.telnet = telnet
+        self.pkg_name = pkg_name
+        self.index_file = index_file
+        self.avd = telnet.avd_name()
+        digest = hashlib.sha256(f"{apk_hash} {self.avd}".encode())
+        for setup_file in setup_files:
+            digest.update(file_hash(setup_file).encode())
+        self.key = digest.hexdigest()
+        self.name = "reprobot_" + re.sub(r"\W", "_", pkg_name) + "_" + self.key[:16]
+        self.index = read_json(index_file) if exists(index_file) else {}
+        self.removed = set()  # kept out of the index when it is merged with the file
+        self.saved = self.name in self.index and self.name in telnet.list_snapshots()
+        self.delete_stale_snapshots()
+        if self.saved:
+            logger.info(f"Using setup snapshot {self.name}")
+
+    def delete_stale_snapshots(self):
+        stale = [name for name, entry in self.index.items()
+                 if entry["pkg_name"] == self.pkg_name and entry["avd"] == self.avd and name != self.name]
+        for name in stale:
+            logger.info(f"Deleting stale setup snapshot {name}")
+            self.telnet.delete_snapshot(name)
+        if self.name in self.index and not self.saved:
+            stale.append(self.name)  # lost on the emulator
+        if len(stale) != 0:
+            self.remove_from_index(stale)
+
+    def remove_from_index(self, names):
+        for name in names:
+            self.index.pop(name, None)
+            self.removed.add(name)
+        self.dump_index()
+
+    def available(self):
+        return self.saved
+
+    def save(self):
+        if not self.telnet.save_snapshot(self.name):
+            logger.error(f"Failed to save setup snapshot {self.name}")
+            return False
+        self.saved = True
+        self.removed.discard(self.name)
+        self.index[self.name] = {"pkg_name": self.pkg_name, "avd": self.avd, "key": self.key, "created": time.time()}
+        self.dump_index()
+        logger.info(f"Saved setup snapshot {self.name}")
+        return True
+
+    def invalidate(self):
+        logger.info(f"Invalidating setup snapshot {self.name}")
+        self.saved = False
+        self.telnet.delete_snapshot(self.name)
+        self.remove_from_index([self.name])
+
+    def dump_index(self):
+        if exists(self.index_file):  # other runs may have added their snapshots
+            try:
+                merged = {**read_json(self.index_file), **self.index}
+                self.index = {name: entry for name, entry in merged.items() if name not in self.removed}
+            except Exception as e:
+                logger.warning(f"Failed to merge snapshot index {self.index_file}: {e}")
+        tmp_file = f"{self.index_file}.{getpid()}.tmp"
+        dump_json(self.index, tmp_file)
+        replace(tmp_file, self.index_file)
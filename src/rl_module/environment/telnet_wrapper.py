@@ -18,16 +18,38 @@ class TelnetWrapper():
         self.tn.write(f"auth {auth}\n".encode("ascii"))
         self.tn.read_until(b"OK", timeout=10)
 
+    def command(self, cmd, timeout=10):
+        # returns whether the console answered OK and the lines it printed before
+        self.tn.write(f"{cmd}\n".encode("ascii"))
+        index, _, t = self.tn.expect([rb"(^|\n)OK\r?\n", rb"(^|\n)KO[^\n]*\n"], timeout=timeout)
+        lines = [line.strip() for line in t.decode(errors="replace").splitlines()]
+        return index == 0, [line for line in lines if line not in ["", "OK"] and not line.startswith("KO")]
+
     def load_snapshot(self, snap_shot_name):
-        self.tn.write(f"avd snapshot load {snap_shot_name}\n".encode("ascii"))
-        t = self.tn.read_until(b"OK", timeout=10)
-        if "OK" not in t.decode():
-            exit("Timeout when loading snapshot. The snapshot may be lost or damaged")
+        ok, _ = self.command(f"avd snapshot load {snap_shot_name}", timeout=60)
+        if not ok:
+            return False  # the snapshot may be lost or damaged
         time.sleep(3)
+        return True
 
     def save_snapshot(self, snap_shot_name):
-        self.tn.write(f"avd snapshot save {snap_shot_name}\n".encode("ascii"))
-        self.tn.read_until(b"OK", timeout=10)
+        ok, _ = self.command(f"avd snapshot save {snap_shot_name}", timeout=120)
+        return ok
+
+    def delete_snapshot(self, snap_shot_name):
+        ok, _ = self.command(f"avd snapshot delete {snap_shot_name}", timeout=60)
+        return ok
+
+    def list_snapshots(self):
+        ok, lines = self.command("avd snapshot list")
+        if not ok:
+            return []
+        # a table with a header line, the snapshot name is the second column
+        return [line.split()[1] for line in lines if len(line.split()) > 1 and line.split()[0] != "ID"]
+
+    def avd_name(self):
+        ok, lines = self.command("avd name")
+        return lines[-1] if ok and len(lines) != 0 else ""
 
     def close(self):
         self.tn.write(b"exit\n")
@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+import time
+from os.path import join, dirname, realpath, exists
+from shutil import copyfile
+
+from rl_module.agents.q_table_server import start_q_table_server
+from utils.cmd_args import apk_file_path, bug_report_file_path, crash_log_file, config_file, snapshot, setup_apk, \
+    setup_test_apk, no_visuals, setup_script, openie_id
+from utils.config import output_dir
+from utils.utils import get_logger
+
+logger = get_logger("parallel-rl")
+
+TOOL_MAIN = join(dirname(dirname(realpath(__file__))), "tool_main.py")
+AUTHKEY_ENV = "REPROBOT_QTABLE_AUTHKEY"
+STOP_GRACE_PERIOD = 60  # seconds the other workers get to finish their step after a worker reproduced the crash
+
+
+def get_worker_output_dir(worker_index):
+    return join(output_dir, f"worker_{worker_index}")
+
+
+def get_worker_cmd(worker_index, s2r_file, device_id, adb_port, q_table_server_address):
+    cmd = [sys.executable, TOOL_MAIN, "-onlyRL", "--s2rFilePath", s2r_file, "--reportFile", bug_report_file_path,
+           "--apkFile", apk_file_path, "--crashLogFile", crash_log_file, "--configFile", config_file,
+           "--deviceId", device_id, "--adbPort", adb_port, "--outputDir", get_worker_output_dir(worker_index),
+           "--qTableServer", q_table_server_address, "--workerId", str(worker_index), "-silent"]
+    if snapshot is not None:
+        cmd += ["--snapshot", snapshot]
+    if setup_apk is not None and setup_test_apk is not None:
+        cmd += ["--setupApk", setup_apk, "--setupTestApk", setup_test_apk]
+    if setup_script is not None:
+        cmd += ["--setupScript", setup_script]
+    if no_visuals:
+        cmd += ["-noVisuals"]
+    cmd += ["--openieIP", openie_id]
+    return cmd
+
+
+def parallel_rl_main(s2r_file, devices):
+    # one `tool_main.py -onlyRL` worker per emulator, all sharing the Q-table served by this process
+    authkey = os.urandom(16)
+    manager = start_q_table_server("127.0.0.1:0", authkey)
+    q_table_store = manager.get_q_table_store()
+    q_table_server_address = "%s:%d" % manager.address
+    logger.info(f"Shared Q-table service listening on {q_table_server_address}, starting {len(devices)} workers")
+    start_time = time.time()
+    env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+    workers = []
+    for worker_index, (device_id, adb_port) in enumerate(devices):
+        cmd = get_worker_cmd(worker_index, s2r_file, device_id, adb_port, q_table_server_address)
+        workers.append(subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL))
+        logger.info(f"Worker {worker_index} started on {device_id} (adb port {adb_port})")
+
+    stop_time = None
+    while any(worker.poll() is None for worker in workers):
+        if stop_time is None and q_table_store.should_stop():
+            stop_time = time.time()
+            logger.info(f"Worker {q_table_store.get_winner()} reproduced the crash, stopping the other workers")
+        if stop_time is not None and time.time() - stop_time > STOP_GRACE_PERIOD:
+            for worker in workers:
+                if worker.poll() is None:
+                    worker.terminate()
+            break
+        time.sleep(1)
+    for worker in workers:
+        worker.wait()
+    rl_running_time = time.time() - start_time
+
+    winner = q_table_store.get_winner()
+    logger.info(f"Shared Q-table size: {q_table_store.size()}")
+    manager.shutdown()
+    if winner is not None:
+        success_action_file = join(get_worker_output_dir(int(winner)), "success_action_seq.json")
+        if exists(success_action_file):
+            copyfile(success_action_file, join(output_dir, "success_action_seq.json"))
+        logger.info(f"Successfully reproduced! (worker {winner})")
+    else:
+        logger.info(f"Failed to reproduce. Terminated due to epoch limit.")
+    logger.info(f"RL Running Time: {rl_running_time}")
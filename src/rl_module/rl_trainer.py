@@ -1,12 +1,22 @@
+import os
+import random
+import signal
+import sys
 import time
 from os.path import join
 
 from rl_module.agents.q_agent import QAgent
+from rl_module.agents.q_table_server import connect_q_table_server
+from rl_module.agents.shared_q_agent import SharedQAgent
 from rl_module.components.action import Action
 from rl_module.environment.app_environment import App_Env
+from rl_module.parallel_rl import AUTHKEY_ENV
 from rl_module.environment.reward_calculator import modify_reward_according_to_next_state
 from utils.config import training_epoch, default_epsilon_decay, default_epsilon, default_learning_rate, \
-    default_discount_factor, rl_running_log_dir, output_dir, allowed_missing_step_count
+    default_discount_factor, rl_running_log_dir, output_dir, allowed_missing_step_count, enable_frontier_restore, \
+    frontier_restore_probability
+from utils.cmd_args import q_table_server, worker_id
+from utils.nlp_util import similarity_cache
 from utils.utils import dump_json, get_logger
 
 logger = get_logger("rl-trainer")
@@ -28,9 +38,22 @@ def dump_total_rewards(total_rewards):
     dump_json(total_rewards, file_path)
 
 
-def rl_main(s2r_file):
-    rl_agent = QAgent(learning_rate=default_learning_rate, discount_factor=default_discount_factor,
+def create_agent():
+    if q_table_server is None:
+        return QAgent(learning_rate=default_learning_rate, discount_factor=default_discount_factor,
                       epsilon=default_epsilon, epsilon_decay=default_epsilon_decay)
+    # worker of a parallel run, the authkey is handed over by the coordinator through the environment
+    # the coordinator terminates workers that outlive the grace period, exit normally so the atexit hooks save the caches
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    q_table_store = connect_q_table_server(q_table_server, bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    return SharedQAgent(q_table_store, worker_id, learning_rate=default_learning_rate,
+                        discount_factor=default_discount_factor, epsilon=default_epsilon,
+                        epsilon_decay=default_epsilon_decay)
+
+
+def rl_main(s2r_file):
+    rl_agent = create_agent()
+    shared = isinstance(rl_agent, SharedQAgent)
 
     app_env = App_Env(s2r_file, total_missing_step=allowed_missing_step_count)
     epoch = 1
@@ -38,22 +61,34 @@ def rl_main(s2r_file):
     rl_running_time = 0
     while True:
         # start the app and dump the initial state to file
-        app_env.refresh_env()
+        frontier_entry = None
+        if enable_frontier_restore and random.random() < frontier_restore_probability:
+            frontier_entry = app_env.frontier.select()
+        if frontier_entry is not None and app_env.restore_frontier(frontier_entry):
+            success_action_seqs = list(frontier_entry.action_prefix)
+        else:
+            app_env.refresh_env()
+            success_action_seqs = []
         step_count = 1
         success_reproduced = False
-        success_action_seqs = []
         total_reward_per_epoch = 0
         epoch_start_time = time.time()
         next_state = None
         while True:
             logger.info(f"Epoch {epoch} Step {step_count}, Epsilon = {rl_agent.epsilon}")
+            if shared:
+                if rl_agent.should_stop():
+                    logger.info("Another worker reproduced the crash, stopping")
+                    break
+                rl_agent.sync()
+            app_env.latency_stats.set_step(epoch, step_count)
             # obtain the state
             if next_state:
                 cur_state = next_state
             else:
                 cur_state = app_env.cur_state()
             # choose an action from environment
-            rl_agent.try_init_q_value_for_state(cur_state, app_env.d.window_size())
+            rl_agent.try_init_q_value_for_state(cur_state, app_env.window_size())
             try:
                 action = rl_agent.choose_action(cur_state)
             except IndexError as e:
@@ -64,7 +99,7 @@ def rl_main(s2r_file):
             # rl_agent.decrease_epsilon()
 
             # execute the action using controller and return the next state as well as the reward
-            reward = app_env.execute_action(action)
+            reward = app_env.execute_action(action, cur_state)
             success_action_seqs.append(action.get_dict())
             logger.info(f"Reward: {reward}")
 
@@ -77,7 +112,7 @@ def rl_main(s2r_file):
             success = app_env.check_termination(next_state)
 
             # dump the state using app controller
-            rl_agent.try_init_q_value_for_state(next_state, app_env.d.window_size())
+            rl_agent.try_init_q_value_for_state(next_state, app_env.window_size())
             rl_agent.learn(cur_state, action, reward, next_state)
             total_reward_per_epoch += reward
             step_count += 1
@@ -85,15 +120,26 @@ def rl_main(s2r_file):
             if success is not None:
                 success_reproduced = success
                 break
+            if enable_frontier_restore and len(next_state.unmatched_s2rs) < len(cur_state.unmatched_s2rs):
+                app_env.frontier.try_add(next_state, app_env, success_action_seqs)  # the device is at next_state
         epoch_end_time = time.time()
         rl_running_time += (epoch_end_time-epoch_start_time)
         total_rewards.append(total_reward_per_epoch)
-        if success_reproduced or epoch >= training_epoch:
+        similarity_cache.log_stats()
+        app_env.latency_stats.log_stats()
+        app_env.state_cache.log_stats()
+        app_env.reset_engine.log_stats()
+        if shared:
+            if success_reproduced:
+                rl_agent.report_success()
+            rl_agent.sync()
+        if success_reproduced or epoch >= training_epoch or (shared and rl_agent.should_stop()):
             break
         rl_agent.dump_q_table()
         dump_total_rewards(total_rewards)
         epoch += 1
     app_env.stop_app()
+    app_env.close()
     if success_reproduced:
         success_action_output_path = join(output_dir, "success_action_seq.json")
         dump_json(success_action_seqs, success_action_output_path)
@@ -1,15 +1,25 @@
 from shutil import copy
 
+from nlp_module.batch_nlp import batch_nlp_main, list_batch_reports
 from nlp_module.process_bug_report import nlp_main
+from rl_module.parallel_rl import parallel_rl_main
 from rl_module.rl_trainer import rl_main
 import utils.config as Config
 
 if __name__ == '__main__':
-    if Config.onlyNLP:
+    if Config.batch_nlp:
+        batch_nlp_main(list_batch_reports(Config.report_dir, Config.report_list_file), Config.nlp_workers)
+    elif Config.onlyNLP:
         nlp_main(Config.bug_report_file_path, Config.s2r_file_path, Config.graphene_output_file)
     elif Config.onlyRL:
         copy(Config.s2r_file_path, Config.nlp_output_dir)
-        rl_main(Config.s2r_file_path)
+        if Config.devices:
+            parallel_rl_main(Config.s2r_file_path, Config.devices)
+        else:
+            rl_main(Config.s2r_file_path)
     else:
         nlp_main(Config.bug_report_file_path, Config.s2r_file_path, Config.graphene_output_file)
-        rl_main(Config.s2r_file_path)
+        if Config.devices:
+            parallel_rl_main(Config.s2r_file_path, Config.devices)
+        else:
+            rl_main(Config.s2r_file_path)
@@ -0,0 +1,62 @@
+import argparse
+import time
+from glob import glob
+from os.path import isdir, join
+
+from utils.ui_hierarchy import parse_ui_hierarchy
+
+# Compares the UI hierarchy parser backends on dumped hierarchies, e.g. the xml files under output/uiautomator_state.
+# Run from the src directory: python -m utils.benchmark_ui_parser ./output/uiautomator_state
+
+VIEW_GROUP_CLASSES = ['android.widget.ListView', 'android.widget.GridView']
+
+
+def query(hierarchy):
+    # the lookups State performs on every step
+    common_filter = {"enabled": "true", "visible-to-user": "true"}
+    not_viewgroup_filter = {"class": lambda x: x not in VIEW_GROUP_CLASSES}
+    results = [
+        hierarchy.find_all(attrs={"clickable": "true", **common_filter, **not_viewgroup_filter}),
+        hierarchy.find_all(attrs={"long-clickable": "true", **common_filter, **not_viewgroup_filter}),
+        hierarchy.find_all(attrs={"scrollable": "true", **common_filter,
+                                  "class": lambda x: x is not None and not x.endswith("ViewPager")}),
+        hierarchy.find_all(attrs={"class": lambda x: x is not None and x.endswith("ViewPager"), **common_filter}),
+        [v for v in hierarchy.find_all(attrs={"package": lambda x: x is not None}) if len(list(v.children)) == 0],
+    ]
+    return sum([len(r) for r in results])
+
+
+def benchmark(xml_strs, backend, repeat):
+    parse_time, query_time, views = 0, 0, 0
+    for _ in range(repeat):
+        for xml in xml_strs:
+            start = time.perf_counter()
+            hierarchy = parse_ui_hierarchy(xml, backend)
+            parsed = time.perf_counter()
+            views += query(hierarchy)
+            query_time += time.perf_counter() - parsed
+            parse_time += parsed - start
+    count = len(xml_strs) * repeat
+    return parse_time / count * 1000, query_time / count * 1000, views // repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the UI hierarchy parser backends.")
+    parser.add_argument("paths", nargs="+", help="xml files or directories searched recursively for xml files")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    files = []
+    for path in args.paths:
+        files.extend(glob(join(path, "**", "*.xml"), recursive=True) if isdir(path) else [path])
+    xml_strs = []
+    for file in files:
+        with open(file, "r") as f:
+            xml_strs.append(f.read())
+    print(f"{len(xml_strs)} hierarchies, {args.repeat} repeats")
+    for backend in ["bs4", "lxml"]:
+        parse_ms, query_ms, views = benchmark(xml_strs, backend, args.repeat)
+        print(f"{backend:>5}: parse {parse_ms:.2f} ms, query {query_ms:.2f} ms per hierarchy ({views} matched views)")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,16 +13,24 @@ parser.add_argument("--crashLogFile", help="path to file containing crash log se
 parser.add_argument("--snapshot", help="snapshot name to be load", default=None)
 parser.add_argument("--setupApk", help="the path to the app used to provide setup scripts", default=None)
 parser.add_argument("--setupTestApk", help="the path to the test apk containing the setup scripts", default=None)
+parser.add_argument("--setupScript", help="the path to a setup script following Evaluation/template.py, used instead of src/utils/setup_run.py", default=None)
 parser.add_argument("--deviceId", help="android device ID", default=None)
 parser.add_argument("--adbPort", help="adb port", default=None)
+parser.add_argument("--devices", help="comma separated deviceId:adbPort pairs, RL runs one worker per device with a shared Q-table", default=None)
+parser.add_argument("--qTableServer", help="host:port of the shared Q-table service, set for the workers of a parallel run", default=None)
+parser.add_argument("--workerId", help="id of the worker in a parallel run", default=None)
 parser.add_argument("-overwriteLog", default=False, action="store_true")
 parser.add_argument("-overwriteNLP", default=False, action="store_true")
 parser.add_argument("-silent", help="if enabled, the log will be only saved to file", default=False, action="store_true")
+parser.add_argument("-noVisuals", help="if enabled, screenshots are neither captured nor annotated during RL", default=False, action="store_true")
 
 # args for variants onlyNLP or onlyRL
 parser.add_argument("-onlyNLP", help="if added, only S2R extraction phase would be executed", default=False, action="store_true")
 parser.add_argument("-onlyRL", help="if added, only S2R matching phase would be executed", default=False, action="store_true")
 parser.add_argument("--s2rFilePath",help="the path to provided S2R file, need if using onlyRL mode", default=None)
+parser.add_argument("--reportDir", help="directory of bug report files to be analyzed in batch, used with onlyNLP mode", default=None)
+parser.add_argument("--reportListFile", help="file listing one bug report path per line to be analyzed in batch, used with onlyNLP mode", default=None)
+parser.add_argument("--nlpWorkers", help="number of processes used by batch NLP mode", default=4, type=int)
 
 # args for replay and exploit
 parser.add_argument("-replay", default=False, action="store_true")
@@ -59,6 +67,9 @@ else:
 snapshot = args.snapshot
 setup_apk = args.setupApk
 setup_test_apk = args.setupTestApk
+setup_script = args.setupScript
+if setup_script and not exists(setup_script):
+    raise Exception(f"Setup script {setup_script} doesn't exist. Please specify it again.")
 setup_apk_pkg = None
 setup_test_apk_pkg= None
 if setup_apk:
@@ -67,12 +78,20 @@ if setup_test_apk:
     setup_test_apk_pkg = APK(setup_test_apk).package
 device_id = args.deviceId
 adb_port = args.adbPort
+devices = [tuple(device.strip().rsplit(":", 1)) for device in args.devices.split(",")] if args.devices else []
+q_table_server = args.qTableServer
+worker_id = args.workerId
 overwriteNLP = args.overwriteNLP
 overwriteLog = args.overwriteLog
 silent = args.silent
+no_visuals = args.noVisuals
 onlyNLP = args.onlyNLP
 onlyRL = args.onlyRL
 s2rFilePath = args.s2rFilePath
+report_dir = args.reportDir
+report_list_file = args.reportListFile
+nlp_workers = args.nlpWorkers
+batch_nlp = onlyNLP and (report_dir is not None or report_list_file is not None)
 replay = args.replay
 exploit = args.exploit
 q_table_file = args.qTableFile
@@ -80,22 +99,22 @@ actions_dir = args.actionsDir
 succStepFile = args.succStepFile
 openie_id = args.openieIP 
 
-device_info = [not device_id, not adb_port]
+device_info = [not device_id, not adb_port] if len(devices) == 0 else [any(len(device) != 2 for device in devices)]
 if exploit:
     raise Exception("Unifinished only exploit mode.")
 
 if replay:
     raise Exception("Unifinished replay mode.")
 
-if onlyNLP and (not bug_report_file_path or not s2rFilePath):
-    raise Exception("Please config reportFile, s2rFilePath in cmd args when using onlyNLP mode.")
+if onlyNLP and not batch_nlp and (not bug_report_file_path or not s2rFilePath):
+    raise Exception("Please config reportFile, s2rFilePath (or reportDir/reportListFile for batch) in cmd args when using onlyNLP mode.")
 
 if onlyRL and (not s2rFilePath or not apk_file_path or not crash_log_file or not bug_report_file_path or any(device_info)):
-    raise Exception("Please config reportFile, s2rFilePath, apkFile, crashLogFile, device id, adb port in cmd args when using onlyRL mode.")
+    raise Exception("Please config reportFile, s2rFilePath, apkFile, crashLogFile, device id, adb port (or devices) in cmd args when using onlyRL mode.")
 
 normal_run = not onlyRL and not onlyNLP and not replay and not exploit
 if normal_run and (not apk_file_path or not crash_log_file or not bug_report_file_path or any(device_info)):
-    raise Exception("Please config reportFile, apkFile, crashLog, device id, adb port in cmd args when using normal mode.")
+    raise Exception("Please config reportFile, apkFile, crashLog, device id, adb port (or devices) in cmd args when using normal mode.")
 
 
 
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import logging
 import sys
@@ -14,8 +15,11 @@ from utils.cmd_args import *
 with open(config_file, "r") as f:
     config = json.load(f)
 
+TOOL_VERSION = "1.0.0"
+
 # commands
 JAVA_CMD = config['commands']['JAVA_CMD']
+JAVAC_CMD = config['commands']['JAVAC_CMD']
 GRAPHENE_JAR = config['commands']['GRAPHENE_JAR']
 ADB_CMD = config['commands']['ADB_CMD']
 
@@ -24,9 +28,11 @@ logger_level = logging.DEBUG
 
 # setup output
 nlp_output_dir = join(output_dir, "nlp_output")
-graphene_output_file =  join(dirname(s2rFilePath), basename(bug_report_file_path).replace(".txt","-graphene.json")) if s2rFilePath else join(nlp_output_dir, basename(bug_report_file_path).replace(".txt","-graphene.json"))
-s2r_file_path = s2rFilePath if s2rFilePath is not None else join(nlp_output_dir,
-                                                                 "s2rs-" + basename(bug_report_file_path).replace(".txt",".json"))
+graphene_output_file, s2r_file_path = None, s2rFilePath
+if bug_report_file_path:  # batch NLP mode has no single report
+    graphene_output_file =  join(dirname(s2rFilePath), basename(bug_report_file_path).replace(".txt","-graphene.json")) if s2rFilePath else join(nlp_output_dir, basename(bug_report_file_path).replace(".txt","-graphene.json"))
+    s2r_file_path = s2rFilePath if s2rFilePath is not None else join(nlp_output_dir,
+                                                                     "s2rs-" + basename(bug_report_file_path).replace(".txt",".json"))
 log_dir = join(output_dir, "logs")
 CURRENT_TIME = datetime.now().strftime('%m-%d-%H:%M:%S')
 uiautomator_state_dir = join(output_dir, "uiautomator_state", CURRENT_TIME)
@@ -36,7 +42,8 @@ logcat_dir = join(output_dir, "logcat", CURRENT_TIME)
 if overwriteNLP:
     rmtree(nlp_output_dir, ignore_errors=True)
 makedirs(nlp_output_dir, exist_ok=True)
-copyfile(bug_report_file_path, join(nlp_output_dir, basename(bug_report_file_path)))
+if bug_report_file_path:
+    copyfile(bug_report_file_path, join(nlp_output_dir, basename(bug_report_file_path)))
 
 if overwriteLog:
     rmtree(log_dir, ignore_errors=True)
@@ -50,8 +57,15 @@ makedirs(rl_running_log_dir, exist_ok=True)
 makedirs(logcat_dir, exist_ok=True)
 
 # NLP config
+spacy_model_name = config['nlp']['spacy_model']
+vector_store_dir = config['nlp']['vector_store_dir']
 sim_s2r_threshold = config['nlp']['sim_s2r_threshold']
 use_openIE5 = config['nlp']['use_openIE5']
+openie_max_workers = config['nlp']['openie_max_workers']
+openie_timeout = config['nlp']['openie_timeout']
+use_graphene_service = config['nlp']['use_graphene_service']
+graphene_pool_size = config['nlp']['graphene_pool_size']
+graphene_timeout = config['nlp']['graphene_timeout']
 enable_context_analysis = config['nlp']['enable_context_analysis']
 enable_relation_analysis = config['nlp']['enable_relation_analysis']
 retrieve_text_using_pattern = config['nlp']['retrieve_text_using_pattern']
@@ -61,6 +75,27 @@ device_words = config['nlp']['device_words']
 multi_action_type_threshold = config['nlp']['multi_action_type_threshold']
 input_target_cue_words = config['nlp']['input_target_cue_words']
 input_value_cue_words = config['nlp']['input_value_cue_words']
+cache_dir = config['nlp']['cache_dir']
+enable_nlp_cache = config['nlp']['enable_nlp_cache']
+nlp_cache_version = config['nlp']['nlp_cache_version']  # pins the NLP cache version, null derives it from the NLP sources
+similarity_cache_size = config['nlp']['similarity_cache_size']
+embedding_cache_size = config['nlp']['embedding_cache_size']  # each entry holds word vectors, keep it much smaller
+persist_similarity_cache = config['nlp']['persist_similarity_cache']
+
+
+def get_vector_source_id():
+    # identifies the vectors the similarities are computed with, so a persisted cache is never read with other vectors
+    if not vector_store_dir:
+        return spacy_model_name
+    meta_file = join(vector_store_dir, "meta.json")
+    if not exists(meta_file):
+        return spacy_model_name + "-mmap"
+    with open(meta_file, "rb") as f:
+        return spacy_model_name + "-mmap-" + hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+similarity_cache_file = join(cache_dir, "similarity", "%s-%s-%s.pkl" % (pkg_name if pkg_name else "default",
+                                                                       get_vector_source_id(), TOOL_VERSION))
 
 empty_s2r = {
     "index": -1,
@@ -119,6 +154,22 @@ default_input_text = config['rl']['default_input_text']
 allow_out_of_order_s2r_match = config['rl'][
     'allow_out_of_order_s2r_match']  # False means everytime we only match the next step from the s2r list. True means we can match all unmatched s2rs at each step.
 init_q_value_with_reward = config['rl']['init_q_value_with_reward']
+ui_hierarchy_parser = config['rl']['ui_hierarchy_parser']  # "lxml" for the lightweight view tree, "bs4" for BeautifulSoup
+# the UI is treated as settled once two consecutive hierarchy dumps are identical, polled every settle_poll_interval
+# seconds after an initial settle_min_wait, giving up after settle_timeout seconds
+settle_min_wait = config['rl']['settle_min_wait']
+settle_poll_interval = config['rl']['settle_poll_interval']
+settle_timeout = config['rl']['settle_timeout']
+state_cache_size = config['rl']['state_cache_size']  # number of interned states, 0 disables interning
+# ways to reset the app at the start of an epoch, tried in order: "snapshot" (emulator snapshot given by --snapshot),
+# "clear" (pm clear and force-stop, once the apk was installed by ReproBot), "reinstall"
+reset_strategies = config['rl']['reset_strategies']
+# without --snapshot, save an emulator snapshot after the first setup and use it for the "snapshot" strategy
+auto_setup_snapshot = config['rl']['auto_setup_snapshot']
+# archive the states where S2Rs were matched as emulator snapshots and start epochs from them with the given probability
+enable_frontier_restore = config['rl']['enable_frontier_restore']
+frontier_restore_probability = config['rl']['frontier_restore_probability']
+frontier_max_size = config['rl']['frontier_max_size']
 
 # default learning configuration
 default_learning_rate = config['rl']['default_learning_rate']
@@ -0,0 +1,100 @@
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.security.Permission;
+import java.util.jar.JarFile;
+
+/**
+ * Keeps one JVM with Graphene loaded and runs the main class of the Graphene jar for every request read from stdin.
+ *
+ * Protocol (one line per request and response):
+ *   "<bug report file>\t<output file>" -> "OK" or "ERR <message>"
+ *   "PING" -> "PONG"
+ *   "QUIT" -> exits
+ * "READY" is printed once the Graphene main class is loaded.
+ */
+public class GrapheneService {
+
+    private static class ExitException extends SecurityException {
+        final int status;
+
+        ExitException(int status) {
+            super("System.exit(" + status + ") called by Graphene");
+            this.status = status;
+        }
+    }
+
+    private static class NoExitSecurityManager extends SecurityManager {
+        volatile boolean allowExit = false;
+
+        @Override
+        public void checkPermission(Permission perm) {
+        }
+
+        @Override
+        public void checkPermission(Permission perm, Object context) {
+        }
+
+        @Override
+        public void checkExit(int status) {
+            if (!allowExit) {
+                throw new ExitException(status);
+            }
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        String mainClassName;
+        try (JarFile jar = new JarFile(args[0])) {
+            mainClassName = jar.getManifest().getMainAttributes().getValue("Main-Class");
+        }
+        Method graphene = Class.forName(mainClassName).getMethod("main", String[].class);
+        NoExitSecurityManager securityManager = new NoExitSecurityManager();
+        System.setSecurityManager(securityManager);
+
+        PrintStream protocol = System.out;
+        System.setOut(System.err); // Graphene's own prints must not mix with the responses
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+        protocol.println("READY");
+        protocol.flush();
+        String line;
+        while ((line = in.readLine()) != null) {
+            line = line.trim();
+            if (line.isEmpty()) {
+                continue;
+            }
+            if (line.equals("PING")) {
+                protocol.println("PONG");
+            } else if (line.equals("QUIT")) {
+                break;
+            } else {
+                protocol.println(run(graphene, line.split("\t")));
+            }
+            protocol.flush();
+        }
+        securityManager.allowExit = true;
+        System.exit(0);
+    }
+
+    private static String run(Method graphene, String[] files) {
+        if (files.length != 2) {
+            return "ERR expected <bug report file>\\t<output file>";
+        }
+        try {
+            graphene.invoke(null, (Object) files);
+            return "OK";
+        } catch (InvocationTargetException e) {
+            Throwable cause = e.getCause();
+            if (cause instanceof ExitException && ((ExitException) cause).status == 0) {
+                return "OK";
+            }
+            cause.printStackTrace();
+            return "ERR " + String.valueOf(cause).replace('\n', ' ');
+        } catch (Exception e) {
+            e.printStackTrace();
+            return "ERR " + String.valueOf(e).replace('\n', ' ');
+        }
+    }
+}
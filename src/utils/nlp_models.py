@@ -0,0 +1,45 @@
+import spacy
+
+from utils.config import spacy_model_name
+from utils.utils import get_logger
+
+logger = get_logger("nlp_models")
+
+# the lemmatizer of the pretrained English pipelines is rule-based and needs the POS tags from tagger and attribute_ruler,
+# so only the syntactic and entity pipes are skipped for similarity
+SIMILARITY_DISABLED_PIPES = ["parser", "ner", "senter"]
+
+loaded_models = {}
+
+
+def load_model(model_name=spacy_model_name):
+    # every module shares one instance of the model, loaded on first use
+    if model_name not in loaded_models:
+        logger.info(f"Loading spaCy model {model_name}...")
+        loaded_models[model_name] = spacy.load(model_name)
+    return loaded_models[model_name]
+
+
+class SpacyModel:
+    # a lazily loaded view of the shared spaCy model that runs with some of its pipes disabled
+    def __init__(self, disable=(), model_name=spacy_model_name):
+        self.disable = list(disable)
+        self.model_name = model_name
+
+    def __call__(self, text):
+        return load_model(self.model_name)(text, disable=self.disable)
+
+    def pipe(self, texts, **kwargs):
+        return load_model(self.model_name).pipe(texts, disable=self.disable, **kwargs)
+
+    @property
+    def vocab(self):
+        return load_model(self.model_name).vocab
+
+    @property
+    def Defaults(self):
+        return load_model(self.model_name).Defaults
+
+
+nlp = SpacyModel()  # full pipeline, for parsing report sentences
+similarity_nlp = SpacyModel(disable=SIMILARITY_DISABLED_PIPES)  # vectors and lemmas only, for word similarity
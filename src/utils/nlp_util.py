@@ -1,17 +1,107 @@
 # import spacy_universal_sentence_encoder
+import atexit
 import re
+from collections import OrderedDict
+from os import getpid, replace
+from os.path import exists
 
-import spacy
+import numpy as np
 from spacy.matcher import Matcher
 
-from utils.config import sim_s2r_threshold
+from utils.config import sim_s2r_threshold, similarity_cache_size, embedding_cache_size, persist_similarity_cache, \
+    similarity_cache_file, vector_store_dir
 # sentence_nlp = spacy_universal_sentence_encoder.load_model("en_use_lg")
-from utils.utils import get_logger
+from utils.nlp_models import nlp, similarity_nlp
+from utils.utils import get_logger, dump_pkl, read_pkl
+from utils.vector_store import VectorStore
 
-nlp = spacy.load("en_core_web_lg")
 logger = get_logger("nlp_util")
 
 
+class SimilarityCache:
+    # LRU cache of word similarities keyed on the cleaned word pair, optionally persisted to disk across runs
+    def __init__(self, max_size, cache_file=None, name="Similarity cache"):
+        self.name = name
+        self.max_size = max_size
+        self.cache_file = cache_file
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        if cache_file and exists(cache_file):
+            try:
+                self.entries.update(read_pkl(cache_file))
+                logger.info(f"Loaded {len(self.entries)} cached word similarities from {cache_file}")
+            except Exception as e:
+                logger.warning(f"Failed to load similarity cache {cache_file}: {e}")
+            self.__evict()
+
+    @staticmethod
+    def make_key(word_a, word_b):
+        return (word_a, word_b) if word_a <= word_b else (word_b, word_a)  # cosine similarity is symmetric
+
+    def get(self, key):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.dirty = True
+        self.__evict()
+
+    def __evict(self):
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total > 0 else 0
+        logger.info(f"{self.name}: {self.hits} hits, {self.misses} misses ({hit_rate:.2%}), {len(self.entries)} entries")
+
+    def save(self):
+        self.log_stats()
+        if not self.cache_file or not self.dirty:
+            return
+        try:
+            if exists(self.cache_file):  # other processes sharing the cache file may have added entries meanwhile
+                merged = OrderedDict(read_pkl(self.cache_file))
+                merged.update(self.entries)
+                self.entries = merged
+                self.__evict()
+            tmp_file = f"{self.cache_file}.{getpid()}.tmp"
+            dump_pkl(dict(self.entries), tmp_file)
+            replace(tmp_file, self.cache_file)
+            self.dirty = False
+            logger.info(f"Saved {len(self.entries)} word similarities to {self.cache_file}")
+        except Exception as e:
+            logger.warning(f"Failed to save similarity cache {self.cache_file}: {e}")
+
+
+similarity_cache = SimilarityCache(similarity_cache_size, similarity_cache_file if persist_similarity_cache else None)
+atexit.register(similarity_cache.save)
+embedding_cache = SimilarityCache(embedding_cache_size, name="Embedding cache")  # cleaned word -> (unit vector, unit lemma vector, lemma text)
+vector_store = None
+
+
+def get_vector_store():
+    # the memory-mapped vectors exported by utils/vector_store.py, if configured; otherwise the spaCy model is used
+    global vector_store
+    if vector_store is None and vector_store_dir:
+        vector_store = VectorStore(vector_store_dir)
+        logger.info(f"Using memory-mapped word vectors from {vector_store_dir} ({vector_store.meta['model']})")
+    return vector_store
+
+
+def get_vectors_length():
+    store = get_vector_store()
+    return store.vectors_length if store is not None else similarity_nlp.vocab.vectors_length
+
+
 def tokenize(sent):
     if isinstance(sent, str):
         sent = sent.split(" ")
@@ -42,10 +132,22 @@ def get_word_similarity(word_a, word_b):
         return 0
     # if word_a in word_b or word_b in word_a:
     #     return 1
-    word_a_token = nlp(word_a)
-    word_a_token_lemma = nlp(" ".join([_.lemma_ for _ in word_a_token]))
-    word_b_token = nlp(word_b)
-    word_b_token_lemma = nlp(" ".join([_.lemma_ for _ in word_b_token]))
+    key = SimilarityCache.make_key(word_a, word_b)
+    cached_sim = similarity_cache.get(key)
+    if cached_sim is not None:
+        return cached_sim
+    sim = float(compute_word_similarity(word_a, word_b))
+    similarity_cache.put(key, sim)
+    return sim
+
+
+def compute_word_similarity(word_a, word_b):
+    if get_vector_store() is not None:
+        return similarity_matrix([word_a], [word_b])[0, 0]
+    word_a_token = similarity_nlp(word_a)
+    word_a_token_lemma = similarity_nlp(" ".join([_.lemma_ for _ in word_a_token]))
+    word_b_token = similarity_nlp(word_b)
+    word_b_token_lemma = similarity_nlp(" ".join([_.lemma_ for _ in word_b_token]))
     orig_form_sim = 0
     if not word_a_token.has_vector:
         logger.warning(f"{word_a_token.text} doesn't have embedding.")
@@ -60,25 +162,129 @@ def get_word_similarity(word_a, word_b):
         lemma_form_sim = max(word_a_token_lemma.similarity(word_b_token_lemma), 0)
     return max(orig_form_sim, lemma_form_sim)
 
+def unit_vector(doc):
+    if not doc.has_vector:
+        return None
+    if doc.vector_norm == 0:
+        return np.zeros(doc.vector.shape, dtype=np.float32)
+    return (doc.vector / doc.vector_norm).astype(np.float32)
+
+
+def embed_words(words):
+    # embed the surface and lemma forms of cleaned words, parsing only the ones not embedded before in one nlp.pipe pass
+    embeddings = {}
+    missing = []
+    for word in dict.fromkeys(words):
+        cached = embedding_cache.get(word)
+        if cached is None:
+            missing.append(word)
+        else:
+            embeddings[word] = cached
+    store = get_vector_store()
+    if len(missing) > 0 and store is not None:
+        for word in missing:
+            embeddings[word] = store.embed(word)
+            embedding_cache.put(word, embeddings[word])
+    elif len(missing) > 0:
+        docs = list(similarity_nlp.pipe(missing))
+        lemma_texts = [" ".join([_.lemma_ for _ in doc]) for doc in docs]
+        lemma_docs = list(similarity_nlp.pipe(lemma_texts))
+        for word, doc, lemma_text, lemma_doc in zip(missing, docs, lemma_texts, lemma_docs):
+            embeddings[word] = (unit_vector(doc), unit_vector(lemma_doc), lemma_text)
+            embedding_cache.put(word, embeddings[word])
+    return embeddings
+
+
+def build_vector_matrix(words, embeddings, form):
+    # stack the unit vectors of one form (0: surface, 1: lemma) into a matrix, rows without a vector are zeros
+    matrix = np.zeros((len(words), get_vectors_length()), dtype=np.float32)
+    has_vector = np.zeros(len(words), dtype=bool)
+    for i, word in enumerate(words):
+        vector = embeddings[word][form] if word in embeddings else None
+        if vector is not None:
+            matrix[i] = vector
+            has_vector[i] = True
+    return matrix, has_vector
+
+
+class WordMatrix:
+    # normalized surface and lemma form vectors of a list of cleaned words
+    def __init__(self, words):
+        self.words = list(words)
+        embeddings = embed_words([w for w in self.words if w != ""])
+        self.orig, self.has_vector = build_vector_matrix(self.words, embeddings, 0)
+        self.lemma, has_lemma_vector = build_vector_matrix(self.words, embeddings, 1)
+        self.lemma_texts = [embeddings[w][2] if has_lemma_vector[i] else None for i, w in enumerate(self.words)]
+
+    def __len__(self):
+        return len(self.words)
+
+    def similarity(self, other):
+        # the same scores as get_word_similarity for every pair of words in self x other, using two matrix products
+        orig_form_sim = self.orig @ other.orig.T
+        lemma_form_sim = self.lemma @ other.lemma.T
+        # spaCy treats docs with identical tokens as fully similar
+        other_words_index = {w: j for j, w in enumerate(other.words)}
+        other_lemmas_index = {l: j for j, l in enumerate(other.lemma_texts) if l is not None}
+        for i, (word, lemma_text) in enumerate(zip(self.words, self.lemma_texts)):
+            if word in other_words_index:
+                orig_form_sim[i, other_words_index[word]] = 1
+            if lemma_text is not None and lemma_text in other_lemmas_index:
+                lemma_form_sim[i, other_lemmas_index[lemma_text]] = 1
+        sims = np.maximum(np.maximum(orig_form_sim, lemma_form_sim), 0)
+        sims[~self.has_vector, :] = 0  # no embedding for the surface form, same as get_word_similarity
+        sims[:, ~other.has_vector] = 0
+        return sims
+
+
+def similarity_matrix(words_a, words_b):
+    return WordMatrix(words_a).similarity(WordMatrix(words_b))
+
+
+class SimilarityMatrix:
+    # precomputed word similarities between two groups of raw strings, looked up with the get_word_similarity signature
+    def __init__(self, words_a, words_b):
+        words_a = list(dict.fromkeys(words_a))
+        words_b = list(dict.fromkeys(words_b))
+        self.index_a = {w: i for i, w in enumerate(words_a)}
+        self.index_b = {w: i for i, w in enumerate(words_b)}
+        self.sims = similarity_matrix([clean_word(w.lower()) for w in words_a], [clean_word(w.lower()) for w in words_b])
+
+    def similarity(self, word_a, word_b):
+        if word_a in self.index_a and word_b in self.index_b:
+            return float(self.sims[self.index_a[word_a], self.index_b[word_b]])
+        return get_word_similarity(word_a, word_b)
+
+
+PASSIVE_RULE = [{'DEP': 'nsubjpass'}, {'DEP': 'aux', 'OP': '*'}, {'DEP': 'auxpass'}, {'TAG': 'VBN'}]
+passive_matcher = None
+
+
+def get_passive_matcher():
+    # compiled once, on first use since the model is loaded lazily
+    global passive_matcher
+    if passive_matcher is None:
+        passive_matcher = Matcher(nlp.vocab)
+        passive_matcher.add('Passive', [PASSIVE_RULE])
+    return passive_matcher
+
+
 def is_passive_voice(sent):
-    matcher = Matcher(nlp.vocab)
-    passive_rule = [{'DEP': 'nsubjpass'}, {'DEP': 'aux', 'OP': '*'}, {'DEP': 'auxpass'}, {'TAG': 'VBN'}]
-    matcher.add('Passive', [passive_rule])
-    matches = matcher(nlp(sent))
+    matches = get_passive_matcher()(nlp(sent))
     if len(matches) > 0:
         return True
     else:
         return False
 
 
+def get_clause_sentence(s2r_sentence):
+    return "%s %s %s" % (s2r_sentence['arg1'], s2r_sentence['relation'], s2r_sentence['arg2'])
+
+
 def check_if_is_S2R(s2r_sentence):
-    sent = "%s %s %s" % (s2r_sentence['arg1'], s2r_sentence['relation'], s2r_sentence['arg2'])
-    if s2r_sentence['arg1'].startswith("I") and is_passive_voice(sent):
-        # the clause was in passive voice and the subject is "I"
-        return False
-    elif not s2r_sentence['arg1'].startswith("I") and not is_passive_voice(sent):
-        return False
-    return True
+    # a S2R is either an active clause with subject "I" or a passive clause without it
+    passive = is_passive_voice(get_clause_sentence(s2r_sentence))
+    return s2r_sentence['arg1'].startswith("I") != passive
 
 
 def keyword_match(match_str, keyword_list):
@@ -1,14 +1,11 @@
 import re
-from os import listdir
-from os.path import join, basename, dirname
-
-import spacy
+from os import walk
+from os.path import join
 
 from utils.config import action_word_list
+from utils.nlp_models import nlp
 from utils.utils import dump_file
 
-nlp = spacy.load("en_core_web_lg")
-
 
 def read_report(bg_path):
     with open(bg_path, "r") as f:
@@ -24,15 +21,24 @@ def read_report(bg_path):
     return content
 
 
-def preprocess_line(line):
+def normalize_line(line):
     line = line.strip(" ").rstrip(".")
     # if "->" in linne or ">" in line or "=>" in line:
     #     print("Contains: -> or >")
     line = line.replace("long-click","long click").replace("long-click","long click")
+    return line
+
+
+def preprocess_line(line):
+    line = normalize_line(line)
+    return preprocess_parsed_line(line, nlp(line))
+
+
+def preprocess_parsed_line(line, doc):
     has_subject = False
     root_verb = None
     mod_word = None
-    token_list = list(nlp(line))
+    token_list = list(doc)
     if all([i.pos_ != "VERB" for i in token_list]) and len(token_list) <= 2:
         line = "Click "+line
         token_list = list(nlp(line))
@@ -75,36 +81,23 @@ def preprocess_line(line):
     line = line + "."
     return line
 
-def obtain_all_reports():
-    BASE_DIR = "/home/zhaoxu/ResearchProject/BugReportReproduction/Evaluation/dataset/bug_reports"
+def obtain_all_reports(base_dir):
+    # all bug reports under a dataset directory, skipping the preprocessed copies
     reports = []
-    for android_version in listdir(BASE_DIR):
-        if not android_version.startswith("Android"):
-            continue
-        for report in listdir(join(BASE_DIR, android_version)):
-            if not report.endswith(".txt") or "-m" in report:
+    for root, _, files in walk(base_dir):
+        for report in files:
+            if not report.endswith(".txt") or report.endswith("-m.txt"):
                 continue
-            reports.append(join(BASE_DIR, android_version, report))
+            reports.append(join(root, report))
+    reports.sort()
     return reports
 
 
 def process_report(src_report, tgt_report=None):
-    content = read_report(src_report)
+    content = [normalize_line(line) for line in read_report(src_report)]
     new_content = []
-    for line in content:
-        new_content.append(preprocess_line(line))
+    for line, doc in zip(content, nlp.pipe(content)):  # parse all lines of the report in one streamed pass
+        new_content.append(preprocess_parsed_line(line, doc))
     new_content = "\n".join(new_content)
     if tgt_report:
         dump_file(new_content, tgt_report)
-
-
-if __name__ == '__main__':
-    reports = obtain_all_reports()
-    for report in reports:
-        print(basename(report))
-        content = read_report(report)
-        new_content = []
-        for line in content:
-            new_content.append(preprocess_line(line))
-        new_file_name = basename(report).replace(".txt", "-m.txt")
-        # dump_report("\n".join(new_content), join(dirname(report), new_file_name))
@@ -0,0 +1,105 @@
+from bs4 import BeautifulSoup, Tag
+
+try:
+    from lxml import etree
+except ImportError:  # the C accelerated parser of the standard library is used instead
+    import xml.etree.ElementTree as etree
+
+EMPTY_HIERARCHY = '<?xml version="1.0" encoding="utf-8"?><hierarchy rotation="0"></hierarchy>'
+
+
+class UIView:
+    # lightweight node of a parsed UI hierarchy, supporting the subset of the bs4 Tag interface ReproBot uses
+    __slots__ = ("name", "attrs", "parent", "children", "position")
+
+    def __init__(self, name, attrs, parent=None, position=0):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+        self.position = position  # index among the children of the parent
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    @property
+    def next_siblings(self):
+        if self.parent is None:
+            return iter(())
+        return iter(self.parent.children[self.position + 1:])
+
+    @property
+    def previous_siblings(self):
+        if self.parent is None:
+            return iter(())
+        return reversed(self.parent.children[:self.position])
+
+    @property
+    def descendants(self):
+        stack = list(reversed(self.children))
+        while stack:
+            view = stack.pop()
+            yield view
+            stack.extend(reversed(view.children))
+
+    def find_all(self, attrs=None):
+        attrs = attrs or {}
+        return [view for view in self.descendants if matches_attrs(view, attrs)]
+
+    def __repr__(self):
+        return f"<{self.name} {self.attrs}>"
+
+
+class UIHierarchy(UIView):
+    # the document root, keeps the raw xml for dumping
+    __slots__ = ("xml",)
+
+    def __init__(self, xml):
+        super().__init__("[document]", {})
+        self.xml = xml
+
+    def prettify(self):
+        return self.xml
+
+
+def matches_attrs(view, attrs):
+    # same semantics as the attrs filter of bs4 find_all: a string must be equal, a callable gets the value or None
+    for key, expected in attrs.items():
+        value = view.attrs.get(key)
+        if callable(expected):
+            if not expected(value):
+                return False
+        elif expected is True:
+            if value is None:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def parse_with_element_tree(xml):
+    root = etree.fromstring(xml.encode("utf-8"))
+    document = UIHierarchy(xml)
+    stack = [(root, document)]
+    while stack:
+        element, parent = stack.pop()
+        view = UIView(element.tag, dict(element.attrib), parent, len(parent.children))
+        parent.children.append(view)
+        for child in reversed(list(element)):
+            if isinstance(child.tag, str):  # skip comments and processing instructions
+                stack.append((child, view))
+    # children were pushed in reverse, so they were appended in document order
+    return document
+
+
+def parse_ui_hierarchy(xml, backend="lxml"):
+    if backend == "bs4":
+        return BeautifulSoup(xml, 'xml')
+    return parse_with_element_tree(xml)
+
+
+def is_view(node):
+    return isinstance(node, (Tag, UIView))
@@ -1,3 +1,5 @@
+import hashlib
+import importlib.util
 import json
 import logging
 import pickle
@@ -8,6 +10,7 @@ from os.path import join, dirname, exists
 import cv2 as cv
 from bs4 import Tag
 
+from utils.ui_hierarchy import is_view
 from utils.config import log_dir, CURRENT_TIME, logger_level, silent, ADB_CMD, retrieve_text_from_siblings, \
     default_input_text
 
@@ -74,6 +77,25 @@ def read_pkl(file_path):
         return pickle.load(f)
 
 
+def load_setup_run(setup_script=None):
+    # the run method of the given setup script, or of utils/setup_run.py by default
+    if setup_script is None:
+        from utils.setup_run import run
+        return run
+    spec = importlib.util.spec_from_file_location("reprobot_setup_script", setup_script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.run
+
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def dump_cv_img(img, file_path):
     dir_name = dirname(file_path)
     if not exists(dir_name):
@@ -95,7 +117,7 @@ def retrieve_text_from_xml_siblings(xml_tag: Tag):
     text_set = set()
     siblings = set(xml_tag.previous_siblings).union(set(xml_tag.next_siblings))
     for child in siblings:
-        if isinstance(child, Tag) and "" != child['text']:
+        if is_view(child) and "" != child['text']:
             if is_clickable_view(child) or is_editable_view(child):  # if the child node is another interactable view, then do not include its text
                 continue
             text_set.add(child['text'].strip())
@@ -108,7 +130,7 @@ def retrieve_text_from_text_label_siblings(xml_tag: Tag):
     def __overlap(inner, outer):
         pass
     ext_set = set()
-    siblings = list(filter( lambda x: isinstance(x, Tag),set(xml_tag.previous_siblings).union(set(xml_tag.next_siblings))))
+    siblings = list(filter( is_view,set(xml_tag.previous_siblings).union(set(xml_tag.next_siblings))))
     if len(siblings) == 1 and siblings[0]["class"]=="android.widget.TextView" and siblings[0]["clickable"]=="false" and xml_tag['text']=="" and xml_tag['content-desc'] == "" and siblings[0]['text']!="":
         # likely to be a text label for a FAB button
         ext_set.add(siblings[0]['text'])
@@ -131,7 +153,7 @@ def retrieve_text_from_xml_child(xml_tag: Tag):
     if xml_tag['text'] != "":
         text_set.add(xml_tag['text'].strip())
     for child in xml_tag.children:
-        if isinstance(child, Tag):
+        if is_view(child):
             if is_clickable_view(child) or is_editable_view(child):  # if the child node is another interactable view, then do not include its text
                 continue
             text_set.update(retrieve_text_from_xml_child(child))
@@ -164,6 +186,53 @@ def is_scrollable_view(view):
 
 def is_back_view(view): # since back view is a fake one (manually created), i just defined its resource id like this
     return view["resource-id"]  == "com.android.systemui:id/back"
+
+# capabilities of a view, computed once per view with the same rules as the is_*_view helpers above
+VIEW_CLICKABLE = 1
+VIEW_LONG_CLICKABLE = 2
+VIEW_EDITABLE = 4
+VIEW_SCROLLABLE = 8
+VIEW_SWIPABLE = 16
+VIEW_BACK = 32
+
+permission_button_rsc_ids = ['com.android.packageinstaller:id/permission_allow_button',
+                             'com.android.packageinstaller:id/permission_deny_button']
+
+
+def get_view_capabilities(view):
+    attrs = view.attrs
+    view_class = attrs.get('class')
+    is_view_group = view_class in viewGroupClasses
+    is_pager = view_class is not None and view_class.endswith("ViewPager")
+    capabilities = 0
+    if view_class == "android.widget.EditText":
+        capabilities |= VIEW_EDITABLE
+    elif not is_view_group:
+        if attrs.get('clickable') == "true":
+            capabilities |= VIEW_CLICKABLE
+        if attrs.get('long-clickable') == "true":
+            capabilities |= VIEW_LONG_CLICKABLE
+    if is_pager:
+        capabilities |= VIEW_SWIPABLE
+    elif attrs.get('scrollable') == "true":
+        capabilities |= VIEW_SCROLLABLE
+    if attrs.get('resource-id') == "com.android.systemui:id/back":
+        capabilities |= VIEW_BACK
+    return capabilities
+
+
+def is_interactable_view(view, pkg_name):
+    # whether the view is one of the clickable, long-clickable, scrollable, swipable views of the app or a permission button
+    attrs = view.attrs
+    if attrs.get('resource-id') in permission_button_rsc_ids:
+        return True
+    if attrs.get('enabled') != "true" or attrs.get('package') != pkg_name or attrs.get('visible-to-user') != "true":
+        return False
+    view_class = attrs.get('class')
+    is_pager = view_class is not None and view_class.endswith("ViewPager")
+    if view_class not in viewGroupClasses and (attrs.get('clickable') == "true" or attrs.get('long-clickable') == "true"):
+        return True
+    return is_pager or attrs.get('scrollable') == "true"
 def restart_adb():
     p = subprocess.Popen(
         [ADB_CMD, "start-server"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -172,9 +241,9 @@ def restart_adb():
 
 
 def is_expand_menu_or_drawer_noop(action):
-    if action.ui_event.view_xml is None or not action.s2r.is_noop_s2r(): # not noop click action
+    if action.ui_event.view is None or not action.s2r.is_noop_s2r(): # not noop click action
         return False
-    view = action.ui_event.view_xml
+    view = action.ui_event.view
     tgt_classes = ["android.widget.ImageView","android.widget.ImageButton"]
     if action.ui_event.action == "CLICK":
         tgt_x, tgt_y = action.ui_event.get_xy()
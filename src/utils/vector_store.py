@@ -0,0 +1,95 @@
+import argparse
+import json
+from os import makedirs
+from os.path import join
+
+import numpy as np
+import spacy
+
+# Word vectors of a spaCy model exported to plain .npy files, so that every process on a host can memory-map the same
+# files and share them through the page cache instead of holding a private copy of the model's vectors.
+#   keys.npy        sorted uint64 string hashes (spaCy orth ids) of the vocabulary
+#   rows.npy        the vector row of each key
+#   lemma_keys.npy  the key of the lemma of each key, lemmatized as a single word
+#   vectors.npy     the vector table, float16 or float32
+KEYS_FILE = "keys.npy"
+ROWS_FILE = "rows.npy"
+LEMMA_KEYS_FILE = "lemma_keys.npy"
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.json"
+
+
+def export_vector_store(model_name, output_dir, dtype="float16", batch_size=2000):
+    nlp = spacy.load(model_name, exclude=["parser", "ner", "senter"])
+    vectors = nlp.vocab.vectors
+    keys = np.array(sorted(vectors.key2row.keys()), dtype=np.uint64)
+    rows = np.array([vectors.key2row[int(k)] for k in keys], dtype=np.int64)
+    lemma_keys = keys.copy()
+    # words are lowercased before comparing them, so only the lowercase entries need a lemma
+    lowercase_keys = [int(k) for k in keys if int(k) in nlp.vocab.strings and nlp.vocab.strings[int(k)].islower()]
+    print(f"Lemmatizing {len(lowercase_keys)} of {len(keys)} vocabulary entries...")
+    key_index = {int(k): i for i, k in enumerate(keys)}
+    texts = [nlp.vocab.strings[k] for k in lowercase_keys]
+    for key, doc in zip(lowercase_keys, nlp.pipe(texts, batch_size=batch_size)):
+        if len(doc) == 1:
+            lemma_keys[key_index[key]] = nlp.vocab.strings.add(doc[0].lemma_)
+    makedirs(output_dir, exist_ok=True)
+    np.save(join(output_dir, KEYS_FILE), keys)
+    np.save(join(output_dir, ROWS_FILE), rows)
+    np.save(join(output_dir, LEMMA_KEYS_FILE), lemma_keys)
+    np.save(join(output_dir, VECTORS_FILE), np.asarray(vectors.data, dtype=dtype))
+    with open(join(output_dir, META_FILE), "w") as f:
+        json.dump({"model": model_name, "dtype": dtype, "shape": list(vectors.data.shape)}, f, indent=4)
+    print(f"Exported {len(keys)} keys and {vectors.data.shape[0]} vectors of {model_name} to {output_dir}")
+
+
+class VectorStore:
+    # read-only, memory-mapped view of an exported vector store
+    def __init__(self, store_dir):
+        with open(join(store_dir, META_FILE), "r") as f:
+            self.meta = json.load(f)
+        self.keys = np.load(join(store_dir, KEYS_FILE), mmap_mode="r")
+        self.rows = np.load(join(store_dir, ROWS_FILE), mmap_mode="r")
+        self.lemma_keys = np.load(join(store_dir, LEMMA_KEYS_FILE), mmap_mode="r")
+        self.vectors = np.load(join(store_dir, VECTORS_FILE), mmap_mode="r")
+        self.vectors_length = self.vectors.shape[1]
+        self.tokenizer = spacy.blank("en").tokenizer  # same tokenization rules as the English pipelines, without the model
+
+    def __find(self, key):
+        i = int(np.searchsorted(self.keys, np.uint64(key)))
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return -1
+
+    def __mean_unit_vector(self, keys):
+        # mirrors Doc.vector: the average over all tokens, tokens without a vector count as zeros
+        total = np.zeros(self.vectors_length, dtype=np.float32)
+        has_vector = False
+        for key in keys:
+            i = self.__find(key)
+            if i >= 0:
+                total += self.vectors[self.rows[i]].astype(np.float32)
+                has_vector = True
+        if not has_vector:
+            return None
+        norm = np.linalg.norm(total)
+        return total / norm if norm > 0 else total
+
+    def embed(self, word):
+        # (unit vector, unit lemma vector, lemma text) in the format of nlp_util.embed_words
+        keys = [token.orth for token in self.tokenizer(word)]
+        lemma_keys = []
+        for key in keys:
+            i = self.__find(key)
+            lemma_keys.append(int(self.lemma_keys[i]) if i >= 0 else key)
+        lemma_text = " ".join([str(k) for k in lemma_keys])  # only compared for equality
+        return self.__mean_unit_vector(keys), self.__mean_unit_vector(lemma_keys), lemma_text
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the word vectors of a spaCy model to a memory-mappable store.")
+    parser.add_argument("--model", default="en_core_web_lg")
+    parser.add_argument("--outputDir", required=True)
+    parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    args = parser.parse_args()
+    export_vector_store(args.model, args.outputDir, args.dtype)